@@ -0,0 +1,86 @@
+'''
+benchmark of the CompareClasses backends (pandas DataFrames vs record_tools records) and matchers
+
+every run goes from the raw inputs (reservations dict and get_classes output) to the basic and exact matches,
+i.e. what CompareClasses does after fetching; the test_mock schedules are scaled up by --scales as in
+bench_candidate_pairs: own classes by sqrt(scale) and online classes by the rest
+'''
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+import record_tools
+import reserve_tools
+from test_mock import get_classes_output_mock
+
+
+OWN_CLASSES_MOCK = {'THU': [{'location_id': 3, 'class_name': 'BRZUCHOMANIA', 'class_id': 6911, 'class_time': '18:00'},
+                            {'location_id': 3, 'class_name': 'qpaa', 'class_id': 520, 'class_time': '08:00'}],
+                    'SAT': [{'location_id': 3, 'class_name': 'BRZUCHOMANIA', 'class_id': 6906, 'class_time': '10:00'}],
+                    'SUN': [{'location_id': 3, 'class_name': 'TABATA', 'class_id': 6907, 'class_time': '09:00'}]}
+
+def scaled_inputs(scale: int):
+    own_scale = max(int(np.sqrt(scale)),1)
+    online_scale = max(scale // own_scale,1)
+
+    # distinct classes in every copy
+    classes = {weekday: [dict(cls, class_id=cls['class_id'] + k*100000) for k in range(own_scale) for cls in wd_cl]
+               for weekday, wd_cl in OWN_CLASSES_MOCK.items()}
+    online = [dict(cls, Id=cls['Id'] + k*100000) for k in range(online_scale) for cls in get_classes_output_mock]
+    return classes, online
+
+def run_pandas(classes, online, matcher):
+    classes_df = reserve_tools.generate_own_classes_df(classes)
+    online_classes_df = reserve_tools.online_classes_to_df(online)
+    abs_times = online_classes_df['StartTime'].copy()
+    classes_df, online_classes_df = reserve_tools.transform_dfs(classes_df, online_classes_df)
+    classes_df, online_classes_df = reserve_tools.sort_dfs(classes_df, online_classes_df, abs_times)
+    if matcher == 'index':
+        return reserve_tools.index_matches(classes_df, online_classes_df)
+    _, _, candidate_pairs_df = reserve_tools.form_candidate_pairs(classes_df, online_classes_df)
+    return reserve_tools.extract_matches(classes_df, online_classes_df, candidate_pairs_df)
+
+def run_records(classes, online, matcher):
+    own = record_tools.generate_own_classes(classes)
+    online_classes = record_tools.online_classes_to_records(online)
+    own, online_classes = record_tools.transform_records(own, online_classes)
+    own, online_classes = record_tools.sort_records(own, online_classes)
+    if matcher == 'index':
+        return record_tools.index_matches(own, online_classes)
+    return record_tools.extract_matches(record_tools.form_candidate_pairs(own, online_classes))
+
+def timeit(f, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1,10,100,1000])
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', FutureWarning)
+
+    runs = [(backend, matcher) for backend in ('pandas','records') for matcher in ('pairs','index')]
+    print(f"{'scale':>6} {'own':>5} {'online':>7} " + ' '.join(f'{b+"/"+m:>15}' for b, m in runs))
+    for scale in args.scales:
+        classes, online = scaled_inputs(scale)
+        n_own = sum(len(wd_cl) for wd_cl in classes.values())
+
+        basic, exact = run_pandas(classes, online, 'pairs')
+        for matcher in ('pairs','index'):
+            basic_rec, exact_rec = run_records(classes, online, matcher)
+            # classes starting at the same time may come in a different order
+            assert sorted((p.own_id,p.online_id) for p in basic_rec) == sorted(basic.index.to_list())
+            assert sorted((p.own_id,p.online_id) for p in exact_rec) == sorted(exact.index.to_list())
+
+        times = [timeit(run_pandas if backend == 'pandas' else run_records, classes, online, matcher)
+                 for backend, matcher in runs]
+        print(f"{scale:>6} {n_own:>5} {len(online):>7} " + ' '.join(f'{1000*t:>13.2f}ms' for t in times))
@@ -0,0 +1,108 @@
+'''
+benchmark of reserve_tools.form_candidate_pairs against the original row-by-row implementation
+
+schedules are test_mock schedules scaled up by --scales: own classes by sqrt(scale) and online classes
+by the rest, so that the number of candidate pairs grows by the scale
+'''
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import reserve_tools
+from test_mock import classes_transformed_sorted_df_dict_mock, online_classes_transformed_sorted_df_dict_mock
+
+
+def form_candidate_pairs_reference(classes_df, online_classes_df):
+    '''
+    original implementation (nested iterrows and DataFrame.append; pandas < 2 only)
+    '''
+    candidate_pairs_df = pd.DataFrame(columns=[reserve_tools.OWN_CLASSES_INDEX,
+                                               reserve_tools.ONLINE_CLASSES_INDEX,
+                                               'correct_StartTime',
+                                               'correct_DayOfWeek',
+                                               'correct_Id',
+                                               'correct_Name',
+                                               'correct_LocationId',
+                                               'correct_IsCanceled',
+                                               'correct_IsReservable',
+                                               'correct_IsEnabled'])
+
+    for i, cls_own in classes_df.iterrows():
+        for j, cls_online in online_classes_df.iterrows():
+
+            rec = {reserve_tools.OWN_CLASSES_INDEX: i,
+                   reserve_tools.ONLINE_CLASSES_INDEX: j,
+                   'correct_StartTime': cls_online['StartTime'] == cls_own['StartTime'],
+                   'correct_DayOfWeek': cls_online['DayOfWeek'] == cls_own['DayOfWeek'],
+                   'correct_Id': cls_online['Id'] == cls_own['Id'],
+                   'correct_Name': cls_online['Name'] == cls_own['Name'],
+                   'correct_LocationId': cls_online['LocationId'] == cls_own['LocationId'],
+                   'correct_IsCanceled': cls_online['IsCanceled'] == False,
+                   'correct_IsReservable': (cls_online['IsReservable'] == True and cls_online['ReservationButton'] != 0),
+                   'correct_IsEnabled': cls_online['IsEnabled'] == True}
+
+            candidate_pairs_df = candidate_pairs_df.append(rec,ignore_index=True)
+
+    candidate_pairs_df = candidate_pairs_df.set_index([reserve_tools.OWN_CLASSES_INDEX,reserve_tools.ONLINE_CLASSES_INDEX])
+
+    dtypes=(bool,bool,np.int64,bool,bool,bool,bool,bool)
+    for dtype, colname in zip(dtypes,candidate_pairs_df.columns):
+        candidate_pairs_df[colname] = candidate_pairs_df[colname].astype(dtype)
+
+    return classes_df, online_classes_df, candidate_pairs_df
+
+
+def scaled_dfs(scale: int):
+    classes_df = pd.DataFrame(classes_transformed_sorted_df_dict_mock)
+    online_classes_df = pd.DataFrame(online_classes_transformed_sorted_df_dict_mock)
+
+    own_scale = max(int(np.sqrt(scale)),1)
+    online_scale = max(scale // own_scale,1)
+
+    def replicate(df, k, index_name):
+        out = pd.concat([df]*k, ignore_index=True)
+        out['Id'] = out['Id'] + np.repeat(np.arange(k),df.shape[0])*100000 # distinct classes in every copy
+        out.index.name = index_name
+        return out
+
+    return (replicate(classes_df, own_scale, reserve_tools.OWN_CLASSES_INDEX),
+            replicate(online_classes_df, online_scale, reserve_tools.ONLINE_CLASSES_INDEX))
+
+
+def timeit(f, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1,10,100,1000])
+    parser.add_argument('--reference_max_scale', type=int, default=100, help='largest scale to run the (slow) original implementation at')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', FutureWarning)
+    has_append = hasattr(pd.DataFrame, 'append')
+
+    print(f"{'scale':>6} {'pairs':>10} {'vectorized':>12} {'reference':>12} {'speedup':>9}")
+    for scale in args.scales:
+        classes_df, online_classes_df = scaled_dfs(scale)
+        n_pairs = classes_df.shape[0]*online_classes_df.shape[0]
+
+        t_new = timeit(reserve_tools.form_candidate_pairs, classes_df, online_classes_df)
+
+        if has_append and scale <= args.reference_max_scale:
+            t_ref = timeit(form_candidate_pairs_reference, classes_df, online_classes_df, repeat=1)
+            _, _, new = reserve_tools.form_candidate_pairs(classes_df, online_classes_df)
+            _, _, ref = form_candidate_pairs_reference(classes_df, online_classes_df)
+            assert new.equals(ref) and (new.dtypes == ref.dtypes).all()
+            print(f"{scale:>6} {n_pairs:>10} {1000*t_new:>10.2f}ms {1000*t_ref:>10.1f}ms {t_ref/t_new:>8.0f}x")
+        else:
+            print(f"{scale:>6} {n_pairs:>10} {1000*t_new:>10.2f}ms {'-':>12} {'-':>9}")
@@ -0,0 +1,105 @@
+'''
+benchmark of html_tools.render_tab against the original pivot + json2html renderer (needs json2html)
+
+every location of the synthetic network has a week of classes: --classes_per_hour classes starting at
+every hour from 6:00 to 21:00
+'''
+import argparse
+import time
+
+import pandas as pd
+
+import html_tools
+from reserve_tools import StartTime_to_class_time, DayOfWeek_to_weekday, RENAME_DICT
+
+
+def render_tab_reference(online_classes_df, location_id):
+    '''
+    original implementation (pandas pivot, json2html and string patching)
+    '''
+    from json2html import json2html
+
+    online_classes_df = online_classes_df.copy()
+    online_classes_df['StartTime'] = online_classes_df['StartTime'].apply(StartTime_to_class_time)
+    online_classes_df['DayOfWeek'] = online_classes_df['DayOfWeek'].apply(DayOfWeek_to_weekday)
+    online_classes_df = online_classes_df.rename({v:k for k,v in RENAME_DICT.items()},axis=1).loc[::,RENAME_DICT.keys()]
+    online_classes_df = online_classes_df.sort_values(by='class_time')
+
+    def parse_div(location_id,weekday,class_name,class_id,class_time):
+        return f'''<div class="activity-cell" data-location-id={location_id} data-day="{weekday}" data-class-name="{class_name}" data-class-id={class_id} data-class-time="{class_time}"><h6>{class_name}</h6><p>id = {class_id}</p></div>'''
+
+    f = lambda x: parse_div(x['location_id'],x['weekday'],x['class_name'],x['class_id'],x['class_time'])
+
+    online_classes_df['parsed_div'] = online_classes_df.apply(f,axis=1)
+    online_classes_df['cumcount'] = online_classes_df.groupby(['class_time','weekday']).cumcount()
+    rdict = html_tools.WEEKDAY_COLUMNS
+    online_classes_df['weekday'] = online_classes_df['weekday'].replace(rdict)
+    pvt = online_classes_df.pivot(index='weekday',columns=['class_time','cumcount'],values='parsed_div').fillna('')
+
+    for day in rdict.values():
+        if day not in pvt.index:
+            pvt.loc[day] = ''
+
+    pvt = pvt.loc[rdict.values()]
+    inpt = pvt.to_dict()
+
+    l = []
+    currh = ''
+    hours = {True:'__HOURODD__',False:'__HOUREVEN__'}
+    switch = True
+    for k,d in inpt.items():
+        d0 = dict()
+        if currh != k[0]:
+            switch= not switch
+            d0['__HOUR0__'] = f'{hours[switch]}{k[0]}'
+            currh = k[0]
+        else:
+            d0['__HOUR0__'] = f'{hours[switch]}'
+        for k0,v0 in d.items():
+            d0[k0] = v0
+        l+= [d0]
+
+    tab = json2html.convert(json = l,table_attributes=f'''id="loc{location_id}"''',escape=False)
+    tab = tab.replace('<tr><td>__HOUREVEN__','''<tr class="even"><td class="hour">''')
+    tab = tab.replace('<tr><td>__HOURODD__','''<tr class="odd"><td class="hour">''')
+    tab = tab.replace('<th>__HOUR0__</th>','''<th class="hour">''')
+    tab = tab.replace('''<td><div class="activity-cell"''','''<td class="cell"><div class="activity-cell"''')
+    return tab
+
+
+def location_df(location_id: int, classes_per_hour: int) -> pd.DataFrame:
+    rows = []
+    for day in range(7):
+        for hour in range(6,22):
+            for k in range(classes_per_hour):
+                rows += [{'StartTime': f'2022-03-{7+day:02d}T{hour:02d}:{15*k % 60:02d}:00',
+                          'Name': f'CLASS {hour} {k}',
+                          'Id': 100000*location_id + 1000*day + 10*hour + k,
+                          'LocationId': location_id,
+                          'DayOfWeek': (day+1) % 7}]
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locations', type=int, nargs='+', default=[10,50,200])
+    parser.add_argument('--classes_per_hour', type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'locations':>9} {'classes':>8} {'single-pass':>12} {'json2html':>12} {'speedup':>8}")
+    for n in args.locations:
+        dfs = [location_df(lid, args.classes_per_hour) for lid in range(n)]
+
+        t0 = time.perf_counter()
+        new = [html_tools.render_tab(df, lid) for lid, df in enumerate(dfs)]
+        t_new = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ref = [render_tab_reference(df, lid) for lid, df in enumerate(dfs)]
+        t_ref = time.perf_counter() - t0
+
+        # render_tab closes the hour header cell, which the original left open
+        assert new == [tab.replace('<th class="hour">', '<th class="hour"></th>', 1) for tab in ref]
+        n_classes = sum(df.shape[0] for df in dfs)
+        print(f"{n:>9} {n_classes:>8} {1000*t_new:>10.1f}ms {1000*t_ref:>10.1f}ms {t_ref/t_new:>7.1f}x")
@@ -0,0 +1,57 @@
+'''
+micro-benchmark of the platinium JSON codecs on recorded get_classes payloads and request bodies
+
+responses are test_mock.get_classes_output_mock (a day at one location) repeated for --days days at
+--locations locations; request bodies are the add_reservation and get_classes fields
+'''
+import argparse
+import json
+import time
+
+from platinium import CODECS
+from test_mock import get_classes_output_mock
+
+
+def timeit(f, *args, number: int = 1000, repeat: int = 5) -> float:
+    '''
+    best time of a single call
+    '''
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for j in range(number):
+            f(*args)
+        best = min(best, (time.perf_counter() - t0)/number)
+    return best
+
+def available_codecs():
+    codecs = []
+    for name, codec in CODECS.items():
+        try:
+            codecs += [codec()]
+        except ImportError:
+            print(f'{name} not installed')
+    return codecs
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, nargs='+', default=[1,7])
+    parser.add_argument('--locations', type=int, default=1)
+    args = parser.parse_args()
+
+    codecs = available_codecs()
+    print(f"{'payload':>28} {'size':>9} " + ' '.join(f'{codec.name:>10}' for codec in codecs))
+
+    for days in args.days:
+        classes = get_classes_output_mock*(days*args.locations)
+        body = json.dumps(classes).encode()
+        times = [timeit(codec.loads, body, number=max(1000//(days*args.locations),10)) for codec in codecs]
+        print(f"{f'loads get_classes x{days*args.locations}':>28} {len(body):>8}B " + ' '.join(f'{1e6*t:>8.1f}us' for t in times))
+
+    requests = {'add_reservation': {'UserId': 123456, 'Date': '2022-03-13T09:00:00', 'ClassScheduleId': 7193},
+                'get_classes': {'LocationId': 3, 'StartDate': '2022-03-13T00:00:00', 'Days': 7, 'UserId': 123456}}
+    for name, fields in requests.items():
+        times = [timeit(codec.dumps, fields, number=10000) for codec in codecs]
+        print(f"{f'dumps {name}':>28} {len(json.dumps(fields)):>8}B " + ' '.join(f'{1e6*t:>8.2f}us' for t in times))
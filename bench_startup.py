@@ -0,0 +1,70 @@
+'''
+import-time profile of the entry points and cold start of booker (fresh interpreters, -X importtime)
+
+booker is expected to reach standby without pandas and numpy: they are imported by the first comparison
+of classes, an hour ahead of the booking window
+'''
+import argparse
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ['booker', 'reservations_tool', 'reserve_tools', 'platinium']
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'aiohttp']
+
+def import_profile(module: str):
+    '''
+    (import time of module in sec, [(cumulative time in sec, name), ...] of its direct imports, heavy modules loaded)
+    '''
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES} if m in sys.modules))"
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+
+    total = 0.
+    imports = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1)//2
+        # imports are listed before their importer, so the direct imports of module precede its own line
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative)/1e6
+            break
+        elif depth == 0:
+            imports = []
+        elif depth == 1:
+            imports += [(int(cumulative)/1e6, name.strip())]
+    heavy = out.stdout.strip()
+    return total, sorted(imports, reverse=True), heavy.split(',') if heavy else []
+
+def cold_start(authfile: str, reservefile: str, repeat: int = 5) -> float:
+    '''
+    best wall time of a fresh interpreter importing booker and loading the auth and reservations files
+    '''
+    code = (f"import booker; b = booker.booker(authfile={authfile!r}, reservefile={reservefile!r}); "
+            f"b.load_auth(b.authfile); b.load_classes(b.reservefile)")
+    best = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--authfile', type=str, default='auth.json')
+    parser.add_argument('--reservefile', type=str, default='reservations.json')
+    parser.add_argument('--top', type=int, default=5, help='number of the slowest top level imports to show')
+    parser.add_argument('--target_ms', type=float, default=500., help='cold start target of booker (interpreter start to standby, without network)')
+    args = parser.parse_args()
+
+    for module in ENTRY_POINTS:
+        total, imports, heavy = import_profile(module)
+        print(f"{module}: {1000*total:.0f} ms of imports; loads {', '.join(heavy) if heavy else 'no heavy modules'}")
+        for t, name in imports[:args.top]:
+            print(f"    {1000*t:8.1f} ms  {name}")
+
+    t = cold_start(args.authfile, args.reservefile)
+    status = 'OK' if 1000*t <= args.target_ms else 'over target'
+    print(f"booker cold start: {1000*t:.0f} ms (target {args.target_ms:.0f} ms) {status}")
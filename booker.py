@@ -1,41 +1,121 @@
+import aiohttp
 import asyncio
 import argparse
 from datetime import datetime, timedelta
-import time
 import json
+import os
+import time
+from typing import Dict, List, Tuple, Union
 
-from platinium import Client
-from platinium import APIException
-from reserve_tools import CompareClasses
+from platinium import AsyncClient, ScheduleCache, ScheduleService, SessionCache
+from platinium import APIException, APIRequestException, ClassRecord, PreparedRequest
+from plan_tools import PlannedReservation, ReservationPlan, WindowPlan
+from timing_tools import ClockOffsetEstimator, DeadlineScheduler, LatencyCompensator, RetryPolicy, next_window, schedule_login
 
 class booker:
 
     def __init__(self,
                  authfile: str,
                  reservefile: str,
-                 timestep: float = 0.001,
+                 approach: float = 1.,
+                 spin: float = 0.002,
                  no_tries: int = 5,
+                 retry: str = 'burst',
+                 retry_delay: float = 0.1,
+                 retry_max_delay: float = 2.,
+                 retry_jitter: float = 0.,
+                 retry_deadline: float = None,
+                 attempt_timeout: float = None,
+                 concurrent: bool = False,
+                 max_concurrency: int = 0,
                  t_reconnect: int = 3500,
-                 dt: timedelta = timedelta(seconds=0)):
-
+                 dt: timedelta = timedelta(seconds=0),
+                 clock_sync: bool = False,
+                 sync_lead: int = 60,
+                 rtt_compensation: bool = False,
+                 margin: float = 0.005,
+                 warm_interval: float = 4.,
+                 fresh_lead: int = 300,
+                 freeze: int = 120,
+                 session_cache: str = '',
+                 matcher: str = 'pairs',
+                 backend: str = 'pandas',
+                 schedule_cache: str = '',
+                 schedule_ttl: float = 600.,
+                 snapshot_ttl: float = 3900.,
+                 name: str = ''):
+
+        self.name = name # account name in multi-account reports
         self.authfile = authfile
         self.reservefile = reservefile
-
-        self.timestep = timestep
+        self.session_cache = SessionCache(session_cache) if session_cache else None
+        self.schedule_cache = ScheduleCache(schedule_cache, ttl=schedule_ttl) if schedule_cache else None
+        self.matcher = matcher
+        self.backend = backend
+        self.snapshot_ttl = snapshot_ttl
+        self.schedule_service = None # set by prepare_booker when schedules are shared with other accounts
+        self.client = None # created by prepare_booker
+
+        self.scheduler = DeadlineScheduler(approach=approach,
+                                           spin=spin)
         self.no_tries = no_tries
+        self.retry_policy = RetryPolicy(mode=retry,
+                                        max_tries=no_tries,
+                                        delay=retry_delay,
+                                        max_delay=retry_max_delay,
+                                        jitter=retry_jitter,
+                                        deadline=retry_deadline,
+                                        timeout=attempt_timeout)
+        self.concurrent = concurrent
+        self.max_concurrency = max_concurrency
         self.t_reconnect = timedelta(seconds=t_reconnect)
         self.dt = dt
 
-    def prepare_booker(self):
+        self.clock_sync = clock_sync
+        self.sync_lead = timedelta(seconds=sync_lead)
+        self.clock_estimator = ClockOffsetEstimator()
+
+        self.rtt_compensation = rtt_compensation
+        self.compensator = LatencyCompensator(margin=margin)
+
+        self.warm_interval = warm_interval
+
+        self.fresh_lead = timedelta(seconds=fresh_lead)
+        self.freeze = timedelta(seconds=freeze)
+        self.login_retry = 30
+        self.login_scheduler = DeadlineScheduler(spin=0.)
 
+    async def prepare_booker(self,
+                             session: aiohttp.ClientSession = None,
+                             schedule_service: ScheduleService = None):
+        '''
+        load the account and log in; session is an aiohttp session and schedule_service a get_classes
+        deduplication shared with other accounts (by default the client has its own session and fetches alone)
+        '''
         self.load_auth(self.authfile)
         self.load_classes(self.reservefile)
 
-        self.client = Client(username=self.username,
-                             password=self.password,
-                             auto_log=True)
-        
-        self.cc = CompareClasses(self.client,self.classes_dict)
+        self.client = AsyncClient(username=self.username,
+                                  password=self.password,
+                                  pool_size=self.pool_size(),
+                                  session_cache=self.session_cache,
+                                  schedule_cache=self.schedule_cache,
+                                  session=session,
+                                  schedule_service=schedule_service)
+        self.schedule_service = schedule_service
+        await self.client.restore_or_login()
+        if self.clock_sync:
+            await self.sync_clock()
+
+        self.cc = None # built by the first comparison; keeps pandas out of the startup
+
+    async def close(self):
+        if self.client is not None: # None if prepare_booker failed before creating it
+            await self.client.close()
+
+    def pool_size(self) -> int:
+        # room for every class of the busiest day plus background requests
+        return max(len(cls) for cls in self.classes) + 2
 
     def get_current_time(self):
 
@@ -43,6 +123,59 @@ class booker:
         t = t + self.dt
         return t
 
+    async def sync_clock(self):
+        '''
+        estimate the server clock offset and use it as dt
+        '''
+        estimate = await self.clock_estimator.estimate(self.client.probe_date)
+        if estimate is None:
+            print(f'{self.get_current_time()}: clock sync failed; keeping time delta = {self.dt}')
+            return
+
+        offset, uncertainty, rtt = estimate
+        self.dt = timedelta(seconds=offset)
+        drift = self.clock_estimator.drift()
+        drift = 'n/a' if drift is None else f'{1e6*drift:.1f} ppm'
+        print(f'{self.get_current_time()}: server clock offset = {1000*offset:.1f} ms +/- {1000*uncertainty:.1f} ms (rtt = {1000*rtt:.1f} ms; drift = {drift})')
+
+    async def measure_rtt(self):
+        '''
+        measure the round trip on the live session to compensate the send time
+        '''
+        rtt = await self.compensator.measure(self.client.probe_date)
+        if rtt is None:
+            print(f'{self.get_current_time()}: rtt measurement failed; requests are sent at the opening')
+            return
+        print(f'{self.get_current_time()}: rtt = {1000*rtt:.1f} ms; requests are sent {1000*self.compensator.lead().total_seconds():.1f} ms ahead of the opening')
+
+    async def compare_classes(self,
+                              t_window: datetime):
+        '''
+        compare own classes with the online ones of the week opening at t_window; the comparison is a report
+        only, so a failure (e.g. the schedule of a club could not be fetched) is printed and reservations go on
+        '''
+        if self.cc is None:
+            from reserve_tools import CompareClasses # pandas and numpy, imported an hour ahead of the window
+            self.cc = CompareClasses(self.client,self.classes_dict,matcher=self.matcher,backend=self.backend)
+
+        self.cc._set_dates(start_date = t_window,
+                           week_ahead = 1,
+                           days_ahead = 7)
+        if self.name:
+            print(f'{self.name}:')
+        try:
+            await self.cc._agenerate_dfs()
+            self.cc._generate_matches()
+        except Exception as e:
+            self.cc.t_fetched = None # no snapshot; failed reservations are diagnosed from refetched classes
+            print(f'{self.get_current_time()}: comparing classes failed ({e}); reserving anyway')
+            return
+        # classes served by the schedule cache are as old as their fetch, not the comparison
+        fetched = [self.client.classes_fetched_at(lid, self.cc.start_date.isoformat(), self.cc.days_ahead)
+                   for lid in self.cc.location_ids]
+        self.cc.t_fetched = min([self.cc.t_fetched] + [t for t in fetched if t is not None])
+        self.cc._print_nonverbose()
+
     def load_auth(self,
                   authfile: str):
 
@@ -60,114 +193,496 @@ class booker:
 
         self.classes = [val for key,val in c.items()]
         self.classes_dict = c
+        # class times parsed once; the window plan serializes the requests ahead of the opening
+        self.plan = ReservationPlan(c)
 
     async def reserve_loop(self):
         t_now = self.get_current_time()
-        current_weekday = t_now.weekday()
         if self.dt:
             print(f'time delta = {self.dt}')
         print(f'{t_now}: standby')
-        check_classes = True
+        t_last = t_now
 
         while True:
-            await asyncio.sleep(self.timestep)
-            t_now = self.get_current_time()
-            new_weekday = t_now.weekday()
+            # requests may be sent slightly before the opening, so never return to the last window
+            t_window = next_window(max(self.get_current_time(), t_last), self.classes)
+            if t_window is None:
+                print(f'{t_now}: no classes to reserve')
+                return
+            print(f'{self.get_current_time()}: next booking window at {t_window}')
 
             # do reservation list checks before making any reservations
-            t_now_plus_delta = t_now + self.t_reconnect
-            if (t_now_plus_delta.weekday() != current_weekday) and check_classes:
-                print('reservation is near... comparing classes')
-                self.cc._set_dates(start_date = t_now_plus_delta,
-                                   week_ahead = 1,
-                                   days_ahead = 7)
-                self.cc._generate_dfs()
-                self.cc._generate_matches()
-                self.cc._print_nonverbose()
-                check_classes = False
-
-            if current_weekday != new_weekday:
-                current_weekday = new_weekday
-                check_classes = True #put the flag back
-
-                for cls in self.classes[current_weekday]:
-                    h,m = cls['class_time'].split(':')
-                    date = t_now.replace(hour=int(h),minute=int(m),second=0,microsecond=0)+timedelta(days=7)
-                    class_id = cls['class_id']
-                    class_name = cls['class_name']
-                    location_id = cls['location_id']
-
-                    success = False
-
-                    err_flags = {'wrong_class_id': False,
-                                   'wrong_class_name':False,
-                                   'wrong_location_id':False,
-                                   'wrong_class_time':False,
-                                   'is_cancelled':False,
-                                   'not_reservable':False,
-                                   'is_disabled':False}
-
-                    for i in range(self.no_tries):
-                        try:
-                            out = self.client.add_reservation(class_id=class_id,date=date.isoformat())
-                            if out['Status'] == 1:
-                                print(f"{t_now}: ({i+1} try) made reservation {class_name} {cls['class_time']}")
-                                success = True
-                                break
-
-                        except APIException:
-                            err_flags['wrong_class_id'] = True
-                            print('wrong class')
-
-                        if not success:
-                            print(f"{t_now}: ({i+1} try) couldnt make a reservation {class_name} {cls['class_time']}; status = {out['Status']}")
-                            time.sleep(.1)
-
-
-
-
-                    if not success:
-                        #figure out reason
-                        date0 = t_now.replace(hour=int(0),minute=int(0),second=0,microsecond=0)+timedelta(days=7)
-                        out_class = self.client.get_classes(location_id=cls['location_id'],start_date=date0.isoformat())
-
-                        match_cls = []
-                        for c in out_class:
-                            if class_id == c['Id']:
-                                  match_cls+=[c]
-
-                        if len(match_cls)!=1:
-                            err_flags['wrong_class_id'] = True
-                        else:
-                            c = match_cls[0]
-                            print(c)
-                            if class_name != c['Name']:
-                                  err_flags['wrong_class_name'] = True
-                            if location_id != c['LocationId']:
-                                  err_flags['wrong_location_id'] = True # dummy flag due to get_classes
-                            if date.isoformat() != c['StartTime']:
-                                  err_flags['wrong_class_time'] = True
-
-                            err_flags['is_cancelled'] = c['IsCanceled'] #not checked yet
-                            err_flags['not_reservable'] = not c['IsReservable'] or (c['ReservationButton'] == 0)
-                            err_flags['is_disabled'] = not c['IsEnabled'] #not checked yet
-
-                        strout = f"{t_now}: failed reservation {class_name} {cls['class_time']} after {no_tries} attempts.  Reasons: "
-                        for key,flag in err_flags.items():
-                            if flag: strout+=f'{key}; '
-                        print(strout)
-        #     else:
-        #         print(f'{t_now}: waiting...')
-
-    async def login_loop(self):
+            t_check = t_window - self.t_reconnect
+            if self.get_current_time() < t_check:
+                await self.scheduler.sleep_until(self.get_current_time, t_check, record=False)
+                if self.clock_sync:
+                    await self.sync_clock()
+            print('reservation is near... comparing classes')
+            await self.compare_classes(t_window)
+            window = self.plan.window(t_window)
+            window.prepare(self.client)
+
+            t_sync = t_window - self.sync_lead
+            if self.get_current_time() < t_sync:
+                await self.scheduler.sleep_until(self.get_current_time, t_sync, record=False)
+                if self.clock_sync:
+                    await self.sync_clock()
+                if self.rtt_compensation:
+                    await self.measure_rtt()
+
+            # the token is renewed fresh_lead before the opening; serialize the requests again if it changed
+            window.prepare(self.client)
+
+            # send ahead of the opening by the one-way latency so that requests arrive at the opening
+            lead = self.compensator.lead() if self.rtt_compensation else timedelta(0)
+
+            # open one connection per class fired at once and keep them hot until the final approach
+            warm_task = None
+            if self.warm_interval > 0:
+                n_connections = self.warm_connections(window)
+                duration = (t_window - lead - self.get_current_time()).total_seconds() - self.scheduler.approach
+                warm_task = asyncio.create_task(self.client.keep_warm(n_connections=n_connections,
+                                                                      interval=self.warm_interval,
+                                                                      duration=duration))
+
+            error = await self.scheduler.sleep_until(self.get_current_time, t_window - lead)
+            t_open = time.perf_counter() + lead.total_seconds()
+            t_now = self.get_current_time()
+            print(f'{t_now}: booking window open (lead = {1000*lead.total_seconds():.1f} ms; fire time error = {1e6*error:.0f} us; max = {1e6*self.scheduler.max_error():.0f} us)')
+
+            await self.reserve_day(window, t_open)
+            t_last = t_window
+            if warm_task is not None and not warm_task.done():
+                warm_task.cancel()
+
+    def warm_connections(self,
+                         window: WindowPlan) -> int:
+        '''
+        number of requests of window in flight at once
+        '''
+        if not self.concurrent:
+            return 1
+        if self.max_concurrency > 0:
+            return min(len(window), self.max_concurrency)
+        return len(window)
+
+    async def reserve_day(self,
+                          window: WindowPlan,
+                          t_open: float = None):
+        '''
+        reserve all classes of a window plan; either one by one or concurrently (at most max_concurrency at a time)
+
+        t_open is the perf_counter time of the window opening
+        (in the future when requests are sent ahead to compensate for the network latency)
+        '''
+        if t_open is None:
+            t_open = time.perf_counter()
+        requests = window.prepare(self.client) # already serialized unless the token changed since
+
+        if self.concurrent:
+            semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency > 0 else None
+            tasks = [self.reserve_class(res, request, t_open, semaphore) for res, request in zip(window.reservations, requests)]
+            results = await asyncio.gather(*tasks)
+        else:
+            results = []
+            for res, request in zip(window.reservations, requests):
+                results += [await self.reserve_class(res, request, t_open)]
+
+        self.print_latency_report(results)
+        await self.diagnose_failures(results)
+        return results
+
+    async def reserve_class(self,
+                            res: PlannedReservation,
+                            request: PreparedRequest,
+                            t_open: float,
+                            semaphore: asyncio.Semaphore = None) -> Dict:
+        '''
+        try to reserve a single class by sending its prepared request as long as retry_policy allows;
+        latency is measured from t_open (window opening)
+        '''
+        cls = res.cls
+        class_name = res.planned.class_name
+
+        err_flags = {'wrong_class_id': False,
+                       'wrong_class_name':False,
+                       'wrong_location_id':False,
+                       'wrong_class_time':False,
+                       'is_cancelled':False,
+                       'not_reservable':False,
+                       'is_disabled':False}
+
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            attempts = await self.retry_policy.run(lambda: self.client.send(request),
+                                                   self.classify_reservation)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+        # reported after the burst so that printing never delays an attempt
+        landing = None
+        for a in attempts:
+            if a['outcome'] == 'success':
+                print(f"{self.get_current_time()}: ({a['try']} try) made reservation {class_name} {cls['class_time']}")
+                continue
+
+            if a['error'] is None:
+                reason = f"status = {a['result'].get('Status')}"
+            else:
+                reason = f"{type(a['error']).__name__}: {a['error']}"
+            print(f"{self.get_current_time()}: ({a['try']} try) couldnt make a reservation {class_name} {cls['class_time']}; {a['outcome']} {reason}")
+            if isinstance(a['error'], APIException):
+                err_flags['wrong_class_id'] = True
+
+        # the first request answered by the server tells when requests land
+        for a in attempts:
+            if a['error'] is None or isinstance(a['error'], APIException):
+                landing = self.compensator.record_landing(class_name, a['t_send'], a['t_recv'], t_open)
+                break
+
+        tries = len(attempts)
+        success = attempts[-1]['outcome'] == 'success'
+        latency = attempts[-1]['t_recv'] - t_open if success else None
+
+        return {'cls': cls,
+                'date': res.date,
+                'success': success,
+                'tries': tries,
+                'latency': latency,
+                'landing': landing,
+                'attempts': [(a['t_send'] - t_open, a['t_recv'] - a['t_send'], a['outcome']) for a in attempts],
+                'err_flags': err_flags}
+
+    def class_snapshot(self) -> Union[List[ClassRecord],None]:
+        '''
+        online classes fetched by the last comparison unless they are older than snapshot_ttl or shared with
+        other accounts (their per-user fields, e.g. ReservationButton, may be those of another account)
+        '''
+        if self.cc is None or self.cc.t_fetched is None or self.schedule_service is not None:
+            return None
+        if time.time() - self.cc.t_fetched > self.snapshot_ttl:
+            return None
+        return self.cc.online_class_records()
+
+    async def diagnose_failures(self,
+                                results: List) -> None:
+        '''
+        find out why reservations failed once the burst is done; classes are looked up in the snapshot of the
+        pre-window comparison or, if it is stale, refetched for all failed classes at once
+        '''
+        failed = [res for res in results if not res['success']]
+        if not failed:
+            return
+
+        def day(res):
+            return res['cls']['location_id'], res['date'].replace(hour=0,minute=0)
+
+        missing = set()
+        snapshot = self.class_snapshot()
+        if snapshot is None:
+            # the current state of the classes, never a cached one
+            days = sorted({day(res) for res in failed})
+            out = await asyncio.gather(*[self.client.get_class_records(location_id=location_id,start_date=date0.isoformat(),use_cache=False)
+                                         for location_id, date0 in days],
+                                       return_exceptions=True)
+            snapshot = []
+            for (location_id, date0), classes in zip(days, out):
+                if isinstance(classes, Exception):
+                    print(f"{self.get_current_time()}: couldnt fetch classes of location {location_id} on {date0.date()}; {classes}")
+                    missing.add((location_id, date0))
+                else:
+                    snapshot += classes
+
+        for res in failed:
+            cls = res['cls']
+            if day(res) not in missing:
+                self.diagnose_reservation(res, snapshot)
+
+            account = f"{self.name}: " if self.name else ''
+            strout = f"{self.get_current_time()}: {account}failed reservation {cls['class_name']} {cls['class_time']} after {res['tries']} attempts.  Reasons: "
+            for key,flag in res['err_flags'].items():
+                if flag: strout+=f'{key}; '
+            print(strout)
+
+    @staticmethod
+    def diagnose_reservation(res: Dict,
+                             classes: List[ClassRecord]) -> Dict:
+        '''
+        set the err_flags of a failed reservation result from the online classes
+        '''
+        cls = res['cls']
+        date = res['date']
+        err_flags = res['err_flags']
+
+        # the class on its day; class ids are unique across locations, so a pre-window snapshot (classes of all
+        # own locations) also finds a class booked at the wrong location
+        match_cls = [c for c in classes
+                     if c.Id == cls['class_id'] and c.start.date() == date.date()]
+
+        if len(match_cls)!=1:
+            err_flags['wrong_class_id'] = True
+        else:
+            c = match_cls[0]
+            print(c)
+            if cls['class_name'] != c.Name:
+                  err_flags['wrong_class_name'] = True
+            if cls['location_id'] != c.LocationId:
+                  err_flags['wrong_location_id'] = True # never set by a refetch, which covers the own location only
+            if date != c.start:
+                  err_flags['wrong_class_time'] = True
+
+            err_flags['is_cancelled'] = c.IsCanceled #not checked yet
+            err_flags['not_reservable'] = not c.IsReservable or (c.ReservationButton == 0)
+            err_flags['is_disabled'] = not c.IsEnabled #not checked yet
+        return err_flags
+
+    @staticmethod
+    def classify_reservation(out: Dict,
+                             error: Exception) -> str:
+        '''
+        outcome of an add_reservation call: 'success' (Status == 1), 'retry' (other Status, 5xx responses,
+        invalid responses, timeouts and connection errors) or 'terminal' (other errors, e.g. 4xx responses)
+        '''
+        if error is None:
+            return 'success' if out.get('Status') == 1 else 'retry'
+        if isinstance(error, APIException):
+            return 'retry' if error.status_code >= 500 else 'terminal'
+        if isinstance(error, (APIRequestException, asyncio.TimeoutError, ConnectionError, aiohttp.ClientError)):
+            return 'retry'
+        return 'terminal'
+
+    def print_latency_report(self,
+                             results: List) -> None:
+
+        account = f" of {self.name}" if self.name else ''
+        print(f"{self.get_current_time()}: reservation latency report{account} (from window opening to Status == 1; landing of the first request <0 early, >0 late)")
+        for res in results:
+            cls = res['cls']
+            if res['success']:
+                latency = f"{1000*res['latency']:.1f} ms"
+            else:
+                latency = 'failed'
+            landing = 'n/a' if res['landing'] is None else f"{1000*res['landing']:+.1f} ms"
+            print(f"    {cls['class_name']} {cls['class_time']} (id={cls['class_id']}): {latency} after {res['tries']} tries; landed {landing}")
+            attempts = ', '.join(f"{1000*t_send:+.1f} ms ({1000*rtt:.1f} ms) {outcome}" for t_send, rtt, outcome in res['attempts'])
+            print(f"        attempts sent at (round trip): {attempts}")
+
+    async def login_loop(self,
+                         classes: List = None):
+        '''
+        renew the token before it expires, a few minutes before every booking window and never during one;
+        the windows are those of classes (by weekday; own classes by default)
+        '''
+        if classes is None:
+            classes = self.classes
+        t_last_login = self.get_current_time() # logged in by prepare_booker
         while True:
+            t_now = self.get_current_time()
+            t_expiry = None
+            if self.client.token_lifetime is not None:
+                t_expiry = t_last_login + timedelta(seconds=self.client.token_lifetime)
+
+            # windows opened less than freeze ago still block logins
+            t_window = next_window(t_now - self.freeze, classes)
+            t_login = schedule_login(t_last_login,
+                                     self.t_reconnect,
+                                     t_expiry=t_expiry,
+                                     t_window=t_window,
+                                     fresh_lead=self.fresh_lead,
+                                     freeze=self.freeze,
+                                     t_now=t_now)
+            print(f"{t_now}: next login at {t_login} (token expiry = {t_expiry})")
+            await self.login_scheduler.sleep_until(self.get_current_time, t_login, record=False)
 
             t_now = self.get_current_time()
-            self.client.login()
+            try:
+                await self.client.login()
+            except Exception as e:
+                print(f"{t_now}: login failed ({e}); retrying in {self.login_retry} sec")
+                await asyncio.sleep(self.login_retry)
+                continue
+            t_last_login = t_now
             sid = self.client.api_session_data['SessionId']
             print(f"{t_now}: connecting to FP (SessionId={sid})")
-            await asyncio.sleep(self.t_reconnect.seconds)
-            #print(client.access_token)
+
+
+def load_accounts(path: str) -> List[Tuple[str,str,str]]:
+    '''
+    (name, authfile, reservefile) of every account
+
+    path is either a directory whose subdirectories (the account names) hold an auth.json and a reservations.json
+    or a json manifest [{"name": ..., "authfile": ..., "reservefile": ...}, ...] with paths relative to it
+    '''
+    accounts = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            authfile = os.path.join(path, name, 'auth.json')
+            reservefile = os.path.join(path, name, 'reservations.json')
+            if os.path.isfile(authfile) and os.path.isfile(reservefile):
+                accounts += [(name, authfile, reservefile)]
+    else:
+        with open(path,'r') as f:
+            manifest = json.load(f)
+        root = os.path.dirname(path)
+        for i, account in enumerate(manifest):
+            accounts += [(account.get('name', f'account{i}'),
+                          os.path.join(root, account['authfile']),
+                          os.path.join(root, account['reservefile']))]
+
+    if not accounts:
+        raise ValueError('no accounts found')
+    names = [name for name, authfile, reservefile in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError('duplicate account name')
+    return accounts
+
+class multibooker:
+    '''
+    bookers of several accounts driven by one event loop
+
+    every account keeps its own logged-in client, but all clients share one aiohttp session (one connection pool);
+    the first account (lead) synchronizes the clock, measures the round trip and keeps the pool warm for all of them;
+    the reservations of all accounts opening at a window are fired at once
+
+    the pre-window comparisons of all accounts run concurrently and share a ScheduleService, so every club
+    schedule is fetched once rather than once per account
+    '''
+
+    def __init__(self,
+                 accounts: List[Tuple[str,str,str]],
+                 clock_sync: bool = False,
+                 **kwargs):
+
+        # the clock is synchronized once by the lead (see sync_clock)
+        self.bookers = [booker(authfile=authfile, reservefile=reservefile, name=name, clock_sync=False, **kwargs)
+                        for name, authfile, reservefile in accounts]
+        self.lead = self.bookers[0]
+        self.clock_sync = clock_sync
+        self.session = None
+        self.schedule_service = ScheduleService()
+        self.t_fired = None # epoch time of the last fire
+        self.fire_error = None
+
+    async def prepare_booker(self):
+
+        for b in self.bookers:
+            b.load_classes(b.reservefile)
+        # the lead pool covers the busiest day of every account
+        pool_size = sum(b.pool_size() for b in self.bookers)
+        self.session = AsyncClient.create_session(pool_size=pool_size)
+
+        await asyncio.gather(*[b.prepare_booker(session=self.session, schedule_service=self.schedule_service) for b in self.bookers])
+        if self.clock_sync:
+            await self.sync_clock()
+
+    async def close(self):
+        for b in self.bookers:
+            if b.client is not None:
+                await b.client.close()
+        if self.session is not None:
+            await self.session.close()
+
+    async def sync_clock(self):
+        await self.lead.sync_clock()
+        for b in self.bookers:
+            b.dt = self.lead.dt
+
+    def get_current_time(self):
+        return self.lead.get_current_time()
+
+    async def reserve_loop(self):
+        lead = self.lead
+        t_now = self.get_current_time()
+        print(f'{t_now}: standby ({len(self.bookers)} accounts)')
+        t_last = t_now
+
+        while True:
+            # the earliest window of any account and the accounts with classes opening at it
+            t = max(self.get_current_time(), t_last)
+            windows = [(next_window(t, b.classes), b) for b in self.bookers]
+            t_window = min((t_window for t_window, b in windows if t_window is not None), default=None)
+            if t_window is None:
+                print(f'{t_now}: no classes to reserve')
+                return
+            active = [b for t_window_b, b in windows if t_window_b == t_window]
+            print(f"{self.get_current_time()}: next booking window at {t_window} ({', '.join(b.name for b in active)})")
+
+            t_check = t_window - lead.t_reconnect
+            if self.get_current_time() < t_check:
+                await lead.scheduler.sleep_until(self.get_current_time, t_check, record=False)
+                if self.clock_sync:
+                    await self.sync_clock()
+            print('reservation is near... comparing classes')
+            before = self.schedule_service.stats()
+            await asyncio.gather(*[b.compare_classes(t_window) for b in active])
+            stats = {key: n - before[key] for key, n in self.schedule_service.stats().items()}
+            print(f"schedules fetched: {stats['fetches']} (shared: {stats['hits']} recent, {stats['joined']} in flight)")
+            plans = [b.plan.window(t_window) for b in active]
+            for b, window in zip(active, plans):
+                window.prepare(b.client)
+
+            lead_time = await self.synchronize(t_window)
+
+            for b, window in zip(active, plans):
+                window.prepare(b.client)
+
+            warm_task = None
+            if lead.warm_interval > 0:
+                n_connections = sum(b.warm_connections(window) for b, window in zip(active, plans))
+                duration = (t_window - lead_time - self.get_current_time()).total_seconds() - lead.scheduler.approach
+                warm_task = asyncio.create_task(lead.client.keep_warm(n_connections=n_connections,
+                                                                      interval=lead.warm_interval,
+                                                                      duration=duration))
+
+            error = await lead.scheduler.sleep_until(self.get_current_time, t_window - lead_time)
+            t_open = time.perf_counter() + lead_time.total_seconds()
+            self.t_fired, self.fire_error = time.time(), error # comparable across processes
+            t_now = self.get_current_time()
+            print(f'{t_now}: booking window open (lead = {1000*lead_time.total_seconds():.1f} ms; fire time error = {1e6*error:.0f} us; max = {1e6*lead.scheduler.max_error():.0f} us)')
+
+            results = await asyncio.gather(*[b.reserve_day(window, t_open) for b, window in zip(active, plans)])
+            self.report(t_window, active, results)
+            t_last = t_window
+            if warm_task is not None and not warm_task.done():
+                warm_task.cancel()
+
+    async def synchronize(self,
+                          t_window: datetime) -> timedelta:
+        '''
+        last clock sync and round trip measurement sync_lead before t_window; returns how much ahead of
+        the opening the requests are sent (every account sends with the round trip of the shared pool)
+        '''
+        lead = self.lead
+        t_sync = t_window - lead.sync_lead
+        if self.get_current_time() < t_sync:
+            await lead.scheduler.sleep_until(self.get_current_time, t_sync, record=False)
+            if self.clock_sync:
+                await self.sync_clock()
+            if lead.rtt_compensation:
+                await lead.measure_rtt()
+
+        return lead.compensator.lead() if lead.rtt_compensation else timedelta(0)
+
+    def report(self,
+               t_window: datetime,
+               active: List[booker],
+               results: List[List]) -> None:
+        self.print_summary(active, results)
+
+    def print_summary(self,
+                      active: List[booker],
+                      results: List[List]) -> None:
+
+        print(f"{self.get_current_time()}: reservations per account")
+        for b, res in zip(active, results):
+            print(f"    {b.name}: {sum(r['success'] for r in res)}/{len(res)} reserved")
+
+    async def login_loop(self):
+        # the windows of every account fire over the shared pool, so no account logs in during any of them
+        classes = [sum(days, []) for days in zip(*[b.classes for b in self.bookers])]
+        await asyncio.gather(*[b.login_loop(classes) for b in self.bookers])
 
 
 def str_to_timedelta(s: str) -> timedelta:
@@ -194,9 +709,109 @@ def str_to_timedelta(s: str) -> timedelta:
     return delta
             
 async def main(booker):
-    t1 = asyncio.create_task(booker.reserve_loop())
-    t2 = asyncio.create_task(booker.login_loop())
-    await asyncio.gather(t1,t2)
+    try:
+        await booker.prepare_booker()
+        t1 = asyncio.create_task(booker.reserve_loop())
+        t2 = asyncio.create_task(booker.login_loop())
+        await asyncio.gather(t1,t2)
+    finally:
+        await booker.close()
+
+def add_booker_arguments(parser: argparse.ArgumentParser) -> None:
+    '''
+    command line options shared by booker.py and supervisor.py
+    '''
+    parser.add_argument('--session_cache', type=str, default='session_cache.json', help='file caching logged-in sessions between runs (empty string disables)')
+    parser.add_argument('--schedule_cache', type=str, default='schedule_cache', help='directory caching fetched class schedules (empty string disables)')
+    parser.add_argument('--schedule_ttl', type=float, default=600., help='time (sec) after which cached class schedules are refetched')
+    parser.add_argument('--snapshot_ttl', type=float, default=3900., help='failed reservations are diagnosed from the classes compared before the window unless they are older than this (sec); otherwise the classes are refetched')
+    parser.add_argument('--dt', type=str, default='0',help='set global advance time lag in formats {r}HH:MM:SS, {r}MM:SS, {r}SS (use prefix {r} for retarded)')
+    parser.add_argument('--local_time', type=str, default='', help='set initial local script time in isoformat YYYY-MM-DD HH:MM:SS (useful for tests of reservations; overwrites --dt parameter)')
+    parser.add_argument('--approach', type=float, default=1. ,help='time before the booking window (sec) when the scheduler switches to the monotonic clock')
+    parser.add_argument('--spin', type=float, default=0.002 ,help='final busy-wait period before the booking window (sec)')
+    parser.add_argument('--no_clock_sync', const=True, action='store_const', default=False, help='do not estimate the server clock offset (implied by --dt and --local_time)')
+    parser.add_argument('--sync_lead', type=int, default=60 ,help='time before the booking window (sec) of the last server clock estimate')
+    parser.add_argument('--no_rtt_compensation', const=True, action='store_const', default=False, help='send reservations at the opening instead of one-way latency ahead of it')
+    parser.add_argument('--margin', type=float, default=0.005 ,help='safety margin (sec) by which reservations should land after the opening')
+    parser.add_argument('--warm_interval', type=float, default=4. ,help='interval (sec) of keep-alive requests on pooled connections before the booking window (0 = no warm-up)')
+    parser.add_argument('--t_reconnect', type=int, default=3600 ,help='client reconnect time (sec) unless the token expires earlier')
+    parser.add_argument('--fresh_lead', type=int, default=300 ,help='time before the booking window (sec) when the token is renewed')
+    parser.add_argument('--freeze', type=int, default=120 ,help='no logins within this time (sec) of the booking window opening')
+    parser.add_argument('--no_tries', type=int, default=5 ,help='number of unsuccesful tries before exit')
+    parser.add_argument('--retry', type=str, default='burst', choices=['burst','exponential','deadline'], help='retry after a fixed delay, after an exponentially growing one or for as long as --retry_deadline allows')
+    parser.add_argument('--retry_delay', type=float, default=0.1, help='delay (sec) between tries (first delay in exponential mode)')
+    parser.add_argument('--retry_max_delay', type=float, default=2., help='longest delay (sec) between tries in exponential mode')
+    parser.add_argument('--retry_jitter', type=float, default=0., help='delays are shortened by a random fraction of at most this much (0 = no jitter)')
+    parser.add_argument('--retry_deadline', type=float, default=0., help='no try starts later than this (sec) after the first one (0 = no deadline)')
+    parser.add_argument('--attempt_timeout', type=float, default=0., help='a try not answered within this time (sec) is abandoned and retried (0 = no timeout)')
+    parser.add_argument('--concurrent', const=True, action='store_const', default=False, help='fire all reservations of a day concurrently')
+    parser.add_argument('--max_concurrency', type=int, default=0 ,help='maximal number of reservations in flight in concurrent mode (0 = no limit)')
+    parser.add_argument('--matcher', type=str, default='pairs', choices=['pairs','index'], help='compare all pairs of own and online classes or look matches up in hash indexes')
+    parser.add_argument('--backend', type=str, default='pandas', choices=['pandas','records'], help='schedules as pandas DataFrames or as lists of plain records (faster for typical schedules)')
+    parser.add_argument('--verbose', const=True, action='store_const', default=False)
+
+def check_booker_arguments(parser: argparse.ArgumentParser,
+                           args: argparse.Namespace) -> None:
+    '''
+    exits with a usage error if the options of add_booker_arguments are inconsistent
+    '''
+    if args.retry == 'deadline' and args.retry_deadline <= 0:
+        parser.error('--retry deadline needs a positive --retry_deadline')
+
+def booker_kwargs(args: argparse.Namespace) -> Dict:
+    '''
+    booker (and multibooker) keyword arguments from the options of add_booker_arguments
+    '''
+    dt = str_to_timedelta(args.dt)
+    local_time = args.local_time
+
+    if local_time!='':
+        dt = datetime.fromisoformat(local_time) - datetime.now()
+
+    # manual time lag disables the automatic estimate of the server clock offset
+    clock_sync = not args.no_clock_sync and args.dt == '0' and local_time == ''
+
+    return dict(approach=args.approach,
+                spin=args.spin,
+                no_tries=args.no_tries,
+                retry=args.retry,
+                retry_delay=args.retry_delay,
+                retry_max_delay=args.retry_max_delay,
+                retry_jitter=args.retry_jitter,
+                retry_deadline=args.retry_deadline if args.retry_deadline > 0 else None,
+                attempt_timeout=args.attempt_timeout if args.attempt_timeout > 0 else None,
+                concurrent=args.concurrent,
+                max_concurrency=args.max_concurrency,
+                t_reconnect=args.t_reconnect,
+                dt=dt,
+                clock_sync=clock_sync,
+                sync_lead=args.sync_lead,
+                rtt_compensation=not args.no_rtt_compensation,
+                margin=args.margin,
+                warm_interval=args.warm_interval,
+                fresh_lead=args.fresh_lead,
+                freeze=args.freeze,
+                session_cache=args.session_cache,
+                matcher=args.matcher,
+                backend=args.backend,
+                schedule_cache=args.schedule_cache,
+                schedule_ttl=args.schedule_ttl,
+                snapshot_ttl=args.snapshot_ttl)
+
+def print_settings(kwargs: Dict) -> None:
+
+    print(f"session cache file: {kwargs['session_cache']}")
+    print(f"schedule cache directory: {kwargs['schedule_cache']} (ttl = {kwargs['schedule_ttl']} sec)")
+    print(f"failures diagnosed from the pre-window snapshot (ttl = {kwargs['snapshot_ttl']} sec)")
+    print(f"time lag dt = {kwargs['dt']} ")
+    print(f"server clock sync = {kwargs['clock_sync']} (last estimate {kwargs['sync_lead']} sec before booking)")
+    print(f"rtt compensation = {kwargs['rtt_compensation']} (safety margin = {kwargs['margin']} sec)")
+    print(f"connection warm-up interval = {kwargs['warm_interval']} sec")
+    print(f"script local time: {datetime.now()+kwargs['dt']}")
+    print(f"final approach = {kwargs['approach']} sec (busy-wait = {kwargs['spin']} sec)")
+    print(f"client reconnect time = {kwargs['t_reconnect']} sec (fresh token {kwargs['fresh_lead']} sec before booking; no logins within {kwargs['freeze']} sec of it)")
+    print(f"number of tries before exit = {kwargs['no_tries']} (retry = {kwargs['retry']}; delay = {kwargs['retry_delay']} sec; jitter = {kwargs['retry_jitter']}; deadline = {kwargs['retry_deadline']} sec; attempt timeout = {kwargs['attempt_timeout']} sec)")
+    print(f"concurrent dispatch = {kwargs['concurrent']} (max concurrency = {kwargs['max_concurrency']})")
 
 if __name__ == "__main__":
 
@@ -204,47 +819,29 @@ if __name__ == "__main__":
 
     parser.add_argument('--authfile', type=str, default='auth.json')
     parser.add_argument('--reservefile', type=str, default='reservations.json')
-    parser.add_argument('--dt', type=str, default='0',help='set global advance time lag in formats {r}HH:MM:SS, {r}MM:SS, {r}SS (use prefix {r} for retarded)')
-    parser.add_argument('--local_time', type=str, default='', help='set initial local script time in isoformat YYYY-MM-DD HH:MM:SS (useful for tests of reservations; overwrites --dt parameter)')
-    parser.add_argument('--timestep', type=float, default=0.001 ,help='micro-timestep')
-    parser.add_argument('--t_reconnect', type=int, default=3600 ,help='client reconnect time')
-    parser.add_argument('--no_tries', type=int, default=5 ,help='number of unsuccesful tries before exit')
-    parser.add_argument('--verbose', const=True, action='store_const', default=False)
+    parser.add_argument('--accounts', type=str, default='', help='book for several accounts at once: a directory of account subdirectories with auth.json and reservations.json or a json manifest of {"name", "authfile", "reservefile"} (overwrites --authfile and --reservefile)')
+    add_booker_arguments(parser)
 
     args = parser.parse_args()
+    check_booker_arguments(parser, args)
 
     authfile = args.authfile
     reservefile = args.reservefile
-    
-    dt = str_to_timedelta(args.dt)
-    local_time = args.local_time
-    
-    if local_time!='':
-        dt = datetime.fromisoformat(local_time) - datetime.now() 
-        
-    timestep = args.timestep
-    no_tries = args.no_tries
-    t_reconnect = args.t_reconnect
-    verbose = args.verbose
-
-
-    b = booker(authfile=authfile,
-               reservefile=reservefile,
-               timestep=timestep,
-               no_tries=no_tries,
-               t_reconnect=t_reconnect,
-               dt=dt)
-    
+    accounts = args.accounts
+    kwargs = booker_kwargs(args)
+
+    if accounts:
+        b = multibooker(load_accounts(accounts), **kwargs)
+    else:
+        b = booker(authfile=authfile, reservefile=reservefile, **kwargs)
+
     print("="*100)
-    print(f"auth file: {authfile}")
-    print(f"reservations file: {reservefile}")
-    print(f"time lag dt = {dt} ")
-    print(f"script local time: {datetime.now()+b.dt}")
-    print(f"micro-timestep = {timestep} sec")
-    print(f"client reconnect time = {t_reconnect} sec")
-    print(f"number of tries before exit = {no_tries}")
+    if accounts:
+        print(f"accounts: {', '.join(bb.name for bb in b.bookers)} (from {accounts})")
+    else:
+        print(f"auth file: {authfile}")
+        print(f"reservations file: {reservefile}")
+    print_settings(kwargs)
     print("="*100)
-    
-    b.prepare_booker()
 
     asyncio.run(main(b))
@@ -1,92 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import os
 from datetime import datetime,timedelta
-from json2html import json2html
+from typing import List, Tuple
+from html import escape
+from pandas import DataFrame
 from tqdm import tqdm
 
 from platinium import Client
-from reserve_tools import generate_online_classes_df, StartTime_to_class_time,DayOfWeek_to_weekday, RENAME_DICT
+from reserve_tools import generate_online_classes_df, StartTime_to_class_time, WEEKDAY_NAMES
 
 
+TAB_VERSION = 2 # bump when the rendered tables change so that cached tabs are rendered again
+
 def generate_tab(client: Client,
                  location_id: int,
                  start_date: datetime = None):
     '''
     generate html table with classes available at location_id
     '''
+    online_classes_df = fetch_location_classes(client, location_id, start_date)
+    return render_tab(online_classes_df, location_id)
+
+def fetch_location_classes(client: Client,
+                           location_id: int,
+                           start_date: datetime = None) -> DataFrame:
+    '''
+    week of online classes at location_id starting from start_date (tomorrow by default)
+    '''
     if start_date == None:
         start_date = datetime.now().replace(hour=0,minute=0,second=0,microsecond=0) + timedelta(days=1)
         
-    online_classes_df = generate_online_classes_df(client=client,
-                                                   location_ids=[location_id],
-                                                   date=start_date,days_forward=7)
-
-    online_classes_df['StartTime'] = online_classes_df['StartTime'].apply(StartTime_to_class_time)
-    online_classes_df['DayOfWeek'] = online_classes_df['DayOfWeek'].apply(DayOfWeek_to_weekday)
-    online_classes_df = online_classes_df.rename({v:k for k,v in RENAME_DICT.items()},axis=1).loc[::,RENAME_DICT.keys()]
-    online_classes_df = online_classes_df.sort_values(by='class_time')
-    
-    
-    def parse_div(location_id,weekday,class_name,class_id,class_time):
-        return f'''<div class="activity-cell" data-location-id={location_id} data-day="{weekday}" data-class-name="{class_name}" data-class-id={class_id} data-class-time="{class_time}"><h6>{class_name}</h6><p>id = {class_id}</p></div>'''
-
-    f = lambda x: parse_div(x['location_id'],x['weekday'],x['class_name'],x['class_id'],x['class_time'])
+    return generate_online_classes_df(client=client,
+                                      location_ids=[location_id],
+                                      date=start_date,days_forward=7)
 
-    online_classes_df['parsed_div'] = online_classes_df.apply(f,axis=1)
-    online_classes_df['cumcount'] = online_classes_df.groupby(['class_time','weekday']).cumcount()
-    rdict = {'MON':'Poniedziałek','TUE':'Wtorek','WED':'Środa','THU':'Czwartek','FRI':'Piątek','SAT':'Sobota','SUN':'Niedziela'}
-    online_classes_df['weekday'] = online_classes_df['weekday'].replace(rdict)
-    pvt = online_classes_df.pivot(index='weekday',columns=['class_time','cumcount'],values='parsed_div').fillna('')
-    
-    #ensure all weekdays are in the table
-    for day in rdict.values():
-        if day not in pvt.index:
-            pvt.loc[day] = ''
-            # print(day)
-    
-    pvt = pvt.loc[rdict.values()]
-    inpt = pvt.to_dict()
-    
-    # pre-formatting
-    l = []
-    currh = ''
-    hours = {True:'__HOURODD__',False:'__HOUREVEN__'}
-    switch = True
-
-    for k,d in inpt.items():
-        d0 = dict()
-        if currh != k[0]:
-            switch= not switch
-            d0['__HOUR0__'] = f'{hours[switch]}{k[0]}'
-            currh = k[0]
+def schedule_hash(online_classes_df: DataFrame) -> str:
+    '''
+    content hash of a location schedule (and of the table format)
+    '''
+    content = str(TAB_VERSION) + online_classes_df.to_json()
+    return hashlib.sha1(content.encode()).hexdigest()
 
-        else:
-            d0['__HOUR0__'] = f'{hours[switch]}'
+WEEKDAY_COLUMNS = {'MON':'Poniedziałek','TUE':'Wtorek','WED':'Środa','THU':'Czwartek','FRI':'Piątek','SAT':'Sobota','SUN':'Niedziela'}
 
-        for k0,v0 in d.items():
-            d0[k0] = v0
+def sorted_classes(online_classes_df: DataFrame) -> List[Tuple]:
+    '''
+    (class_time, weekday, class_name, class_id, location_id) of online_classes_df sorted by class_time
+    '''
+    return sorted(((StartTime_to_class_time(start_time), WEEKDAY_NAMES[dow], name, int(id), int(lid))
+                   for start_time, dow, name, id, lid in zip(online_classes_df['StartTime'],
+                                                             online_classes_df['DayOfWeek'],
+                                                             online_classes_df['Name'],
+                                                             online_classes_df['Id'],
+                                                             online_classes_df['LocationId'])),
+                  key=lambda cls: cls[0])
+
+def render_data(online_classes_df: DataFrame) -> str:
+    '''
+    compact json schedule of online_classes_df, rendered into a table by the tool itself (renderTable in the
+    template): [[class_time, weekday, class_name, class_id], ...] sorted by class_time
+    '''
+    data = [cls[:4] for cls in sorted_classes(online_classes_df)]
+    return json.dumps(data, separators=(',',':')).replace('</','<\\/') # safe to inline into <script>
 
-        l+= [d0]
+def render_tab(online_classes_df: DataFrame,
+               location_id: int) -> str:
+    '''
+    render html table of online_classes_df (as returned by fetch_location_classes)
 
-    inpt = l
-    
-    #json2html conversion
-    tab = json2html.convert(json = inpt,table_attributes=f'''id="loc{location_id}"''',escape=False)
-    
-    tab = tab.replace('<tr><td>__HOUREVEN__','''<tr class="even"><td class="hour">''')
-    tab = tab.replace('<tr><td>__HOURODD__','''<tr class="odd"><td class="hour">''')
-    # html = html.replace('<td>__HOUREVEN__','''<td class="hour">''')
-    tab = tab.replace('<th>__HOUR0__</th>','''<th class="hour">''')
-    tab = tab.replace('''<td><div class="activity-cell"''','''<td class="cell"><div class="activity-cell"''')
-    
-    return tab
+    the table has a column per weekday and a row per class hour (more rows if several classes of a weekday
+    start at the same time); it is emitted in a single pass over the classes sorted by class_time
+    '''
+    classes = sorted_classes(online_classes_df)
+
+    out = [f'''<table id="loc{location_id}"><thead><tr><th class="hour"></th>''']
+    out += [f'<th>{day}</th>' for day in WEEKDAY_COLUMNS.values()]
+    out += ['</tr></thead><tbody>']
+
+    odd = False
+    cells = {day: [] for day in WEEKDAY_COLUMNS}
+    for i, (class_time, weekday, class_name, class_id, lid) in enumerate(classes):
+        cells[weekday] += [render_cell(lid, weekday, class_name, class_id, class_time)]
+
+        # flush the rows of an hour after its last class
+        if i+1 == len(classes) or classes[i+1][0] != class_time:
+            stripe = 'odd' if odd else 'even'
+            for row in range(max(len(c) for c in cells.values())):
+                hour = class_time if row == 0 else ''
+                out += [f'''<tr class="{stripe}"><td class="hour">{hour}</td>''']
+                for day in WEEKDAY_COLUMNS:
+                    out += [f'''<td class="cell">{cells[day][row]}</td>''' if row < len(cells[day]) else '<td></td>']
+                out += ['</tr>']
+            odd = not odd
+            cells = {day: [] for day in WEEKDAY_COLUMNS}
+
+    out += ['</tbody></table>']
+    return ''.join(out)
+
+def render_cell(location_id: int,
+                weekday: str,
+                class_name: str,
+                class_id: int,
+                class_time: str) -> str:
+    name = escape(class_name)
+    return f'''<div class="activity-cell" data-location-id={location_id} data-day="{weekday}" data-class-name="{name}" data-class-id={class_id} data-class-time="{class_time}"><h6>{name}</h6><p>id = {class_id}</p></div>'''
 
 
 def generate_html(client: Client,
                   template_file: str = 'reservations_tool.template',
                   html_file: str = 'reservations_tool.html',
-                  start_date: datetime = None):
+                  start_date: datetime = None,
+                  tab_cache_file: str = 'reservations_tool_tabs.json',
+                  max_workers: int = 8,
+                  lazy: bool = False):
     '''
     generate html file with creation/modification reservation tool (to run in web browser)
+
+    location tabs are built concurrently by at most max_workers threads; a tab whose schedule hash matches
+    the one stored in tab_cache_file is reused instead of rendered again (None disables the tab cache)
+
+    with lazy=True the schedules are emitted as compact json (see render_data) instead of html tables and the
+    tool renders the table of a location only once it is selected, so the file size and load time stay small
+    as locations grow
     '''
     
     print('generating reservations tool HTML file...')
@@ -97,13 +134,47 @@ def generate_html(client: Client,
 
     location_ids = str([ f'''loc{loc['Id']}''' for loc in locs])
     location_names = str([ f'''{loc['Name']}''' for loc in locs])
-    
-    tabs = ''
-    for loc in tqdm(locs):
-        id = loc['Id']
-        tabs += generate_tab(client, id, start_date)
 
-    html = template.replace('__CONTAINER__',tabs).replace('__LOCATIONIDS__',location_ids).replace('__LOCATIONNAMES__',location_names)
+    tab_cache = dict()
+    if tab_cache_file is not None and os.path.exists(tab_cache_file):
+        with open(tab_cache_file,'r') as f:
+            tab_cache = json.load(f)
 
-    with open(html_file,'w') as f:
-        f.write(html)
\ No newline at end of file
+    def build_tab(loc):
+        id = loc['Id']
+        online_classes_df = fetch_location_classes(client, id, start_date)
+        h = schedule_hash(online_classes_df)
+        cached = tab_cache.get(str(id))
+        if cached is not None and cached['hash'] == h and cached.get('lazy',False) == lazy:
+            return cached['tab'], h, True
+        if lazy:
+            return render_data(online_classes_df), h, False
+        return render_tab(online_classes_df, id), h, False
+
+    head, middle = template.split('__CONTAINER__')
+    middle, tail = middle.split('__SCHEDULES__')
+    head, middle, tail = [part.replace('__LOCATIONIDS__',location_ids).replace('__LOCATIONNAMES__',location_names)
+                          for part in (head, middle, tail)]
+
+    n_reused = 0
+    new_tab_cache = dict()
+    tmp_file = html_file + '.tmp'
+    try:
+        with open(tmp_file,'w') as f, ThreadPoolExecutor(max_workers=max(min(max_workers,len(locs)),1)) as executor:
+            # html tables go into the container, json schedules into the script
+            f.write(head + middle + '{' if lazy else head)
+            # tabs are written as soon as they are ready, in the order of locations
+            for i, (loc, (tab, h, reused)) in enumerate(zip(locs, tqdm(executor.map(build_tab, locs),total=len(locs)))):
+                f.write(f'''{',' if i else ''}"loc{loc['Id']}":{tab}''' if lazy else tab)
+                n_reused += reused
+                new_tab_cache[str(loc['Id'])] = {'hash': h, 'tab': tab, 'lazy': lazy}
+            f.write('}' + tail if lazy else middle + '{}' + tail)
+        os.replace(tmp_file, html_file) # never leave a half-written tool behind
+    finally:
+        if os.path.exists(tmp_file): # e.g. a location could not be fetched
+            os.remove(tmp_file)
+    print(f'{n_reused} of {len(locs)} location tabs reused')
+
+    if tab_cache_file is not None:
+        with open(tab_cache_file,'w') as f:
+            json.dump(new_tab_cache,f)
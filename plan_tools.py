@@ -0,0 +1,100 @@
+'''
+reservations.json compiled into an immutable reservation plan
+
+the plan parses class times once at load; the plan of a booking window holds the absolute class dates
+and, per token, the add_reservation requests serialized ahead of time so that the window opening
+only sends bytes
+'''
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from platinium import PreparedRequest
+
+
+class PlannedClass:
+    '''
+    own class of reservations.json; offset is the time from the opening of its booking window
+    (midnight a week before) to the class start
+    '''
+    __slots__ = ('cls', 'class_id', 'class_name', 'location_id', 'class_time', 'offset')
+
+    def __init__(self, cls: Dict):
+        h,m = cls['class_time'].split(':')
+        self.cls = cls
+        self.class_id = cls['class_id']
+        self.class_name = cls['class_name']
+        self.location_id = cls['location_id']
+        self.class_time = cls['class_time']
+        self.offset = timedelta(days=7, hours=int(h), minutes=int(m))
+
+    def __repr__(self):
+        return f'PlannedClass({self.class_name} {self.class_time} id={self.class_id})'
+
+
+class ReservationPlan:
+    '''
+    own classes by weekday (reservations.json order, MON first) as tuples of PlannedClasses
+
+    indexed like the classes lists by datetime.weekday(), so it also works with next_window
+    '''
+    __slots__ = ('days',)
+
+    def __init__(self, classes_dict: Dict):
+        self.days = tuple(tuple(PlannedClass(cls) for cls in day) for day in classes_dict.values())
+
+    def __getitem__(self, weekday: int) -> Tuple[PlannedClass, ...]:
+        return self.days[weekday]
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def window(self, t_window: datetime) -> 'WindowPlan':
+        '''
+        plan of the booking window opening at t_window
+        '''
+        return WindowPlan(t_window, self.days[t_window.weekday()])
+
+
+class PlannedReservation:
+    '''
+    planned class with the absolute start date of the class booked in a window
+    '''
+    __slots__ = ('planned', 'date', 'date_iso')
+
+    def __init__(self, planned: PlannedClass, t_window: datetime):
+        self.planned = planned
+        self.date = t_window + planned.offset
+        self.date_iso = self.date.isoformat()
+
+    @property
+    def cls(self) -> Dict:
+        return self.planned.cls
+
+
+class WindowPlan:
+    '''
+    reservations of the booking window opening at t_window
+
+    prepare(client) serializes their add_reservation requests and keeps them until the client token changes
+    '''
+    __slots__ = ('t_window', 'reservations', 'requests', 'token')
+
+    def __init__(self, t_window: datetime, planned: Tuple[PlannedClass, ...]):
+        self.t_window = t_window
+        self.reservations = tuple(PlannedReservation(p, t_window) for p in planned)
+        self.requests = None
+        self.token = None
+
+    def __len__(self) -> int:
+        return len(self.reservations)
+
+    def prepare(self, client) -> Tuple[PreparedRequest, ...]:
+        '''
+        add_reservation requests of the window for the current token of client
+        '''
+        token = client.headers.get('authorization')
+        if self.requests is None or token != self.token:
+            self.requests = tuple(client.prepare_add_reservation(r.planned.class_id, r.date_iso)
+                                  for r in self.reservations)
+            self.token = token
+        return self.requests
@@ -1,2 +1,17 @@
-from platinium.client import Client
-from platinium.exceptions import APIException
\ No newline at end of file
+from platinium.codec import CODECS, JSONCodec, OrjsonCodec, get_codec
+from platinium.exceptions import APIException, APIRequestException
+from platinium.prepared import PreparedRequest
+from platinium.records import CLASS_FIELDS, ClassRecord, parse_classes
+from platinium.schedule_cache import ScheduleCache
+from platinium.schedule_service import ScheduleService
+from platinium.session_cache import SessionCache
+
+# the clients pull in their http stacks (requests, aiohttp); import them on first use only
+_CLIENT_MODULES = {'Client': 'platinium.client',
+                   'AsyncClient': 'platinium.async_client'}
+
+def __getattr__(name):
+    if name in _CLIENT_MODULES:
+        import importlib
+        return getattr(importlib.import_module(_CLIENT_MODULES[name]), name)
+    raise AttributeError(f"module 'platinium' has no attribute '{name}'")
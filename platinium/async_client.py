@@ -0,0 +1,245 @@
+"""
+asyncio flavour of the Fitness Platinium Gym API client
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Dict, List, Tuple
+
+import aiohttp
+import asyncio
+from email.utils import parsedate_to_datetime
+import time
+
+from .base_client import BaseClient
+from .codec import JSONCodec
+from .exceptions import APIException, APIRequestException
+from .prepared import PreparedRequest
+from .records import ClassRecord, parse_classes
+from .schedule_cache import ScheduleCache
+from .schedule_service import ScheduleService
+from .session_cache import SessionCache
+
+class AsyncClient(BaseClient):
+    '''
+    non-blocking client with the same surface as Client; every API call is a coroutine
+
+    requests share one aiohttp session whose connector keeps up to pool_size connections alive;
+    warm_up/keep_warm open them ahead of time so that time-critical requests skip DNS, TCP and TLS handshakes
+
+    clients of several accounts may share one session (see create_session); it is closed by its creator, not by close();
+    they may also share a ScheduleService so that each schedule is fetched once for all of them
+    '''
+
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 pool_size: int = 10,
+                 keepalive_timeout: float = 75.,
+                 ttl_dns_cache: int = 300,
+                 session_cache: SessionCache = None,
+                 schedule_cache: ScheduleCache = None,
+                 codec: JSONCodec = None,
+                 session: aiohttp.ClientSession = None,
+                 schedule_service: ScheduleService = None):
+        super().__init__(username, password, session_cache, schedule_cache, codec)
+
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.session = session # unless shared, created lazily inside the running event loop
+        self.shared_session = session is not None
+        if self.shared_session:
+            self.pool_size = session.connector.limit
+        self.schedule_service = schedule_service # get_classes shared with the clients of other accounts
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @staticmethod
+    def create_session(pool_size: int = 10,
+                       keepalive_timeout: float = 75.,
+                       ttl_dns_cache: int = 300) -> aiohttp.ClientSession:
+        '''
+        session with a keep-alive pool of pool_size connections; must be called inside the running event loop
+        '''
+        connector = aiohttp.TCPConnector(limit=pool_size,
+                                         keepalive_timeout=keepalive_timeout,
+                                         ttl_dns_cache=ttl_dns_cache)
+        return aiohttp.ClientSession(connector=connector)
+
+    def _init_session(self) -> aiohttp.ClientSession:
+        return self.create_session(self.pool_size, self.keepalive_timeout, self.ttl_dns_cache)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            if self.shared_session:
+                raise RuntimeError('shared session is closed')
+            self.session = self._init_session()
+        return self.session
+
+    async def close(self) -> None:
+        if self.shared_session:
+            return
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _request(self, method: str, uri: str, **kwargs) -> Dict:
+        # headers are passed per request so that a new token never requires a new session
+        kwargs.setdefault('headers',self.headers)
+        async with self._get_session().request(method.upper(),uri,**kwargs) as response:
+            body = await response.read()
+        return self._handle_response(response, body)
+
+    def _handle_response(self, response: aiohttp.ClientResponse, body: bytes) -> Dict:
+        # the codec parses the raw bytes; they are decoded to text for error messages only
+        if not (200 <= response.status < 300):
+            raise APIException(response, response.status, body.decode(errors='replace'))
+        try:
+            return self.codec.loads(body)
+        except ValueError:
+            raise APIRequestException('Invalid Response: %s' % body.decode(errors='replace'))
+
+    async def _get(self, uri: str, **kwargs):
+        return await self._request(method='get',uri=uri,**kwargs)
+
+    async def _post(self, uri: str, **kwargs):
+        return await self._request(method='post',uri=uri,**kwargs)
+
+    async def _put(self, uri: str, **kwargs):
+        return await self._request(method='put',uri=uri,**kwargs)
+
+    async def _delete(self, uri: str, **kwargs):
+        return await self._request(method='delete',uri=uri,**kwargs)
+
+    async def probe_date(self) -> Tuple[float,float,float]:
+        '''
+        cheap HEAD request used for clock synchronization;
+        returns local send time, local receive time and server time from the Date header (epoch seconds)
+        '''
+        t_send = time.time()
+        async with self._get_session().head(self.BASE_URL,headers=self.headers) as response:
+            t_recv = time.time()
+            date = response.headers.get('Date')
+            await response.read() # a consumed response returns its connection to the pool
+        if date is None:
+            raise APIRequestException('Invalid Response: no Date header')
+        return t_send, t_recv, parsedate_to_datetime(date).timestamp()
+
+    async def warm_up(self, n_connections: int = None) -> int:
+        '''
+        open n_connections (at most pool_size) pooled connections with concurrent probes;
+        returns the number of connections that answered
+        '''
+        n = self.pool_size if n_connections is None else min(n_connections, self.pool_size)
+        results = await asyncio.gather(*[self.probe_date() for i in range(n)], return_exceptions=True)
+        return sum(not isinstance(r, Exception) for r in results)
+
+    async def keep_warm(self,
+                        n_connections: int = None,
+                        interval: float = 4.,
+                        duration: float = 60.) -> List[int]:
+        '''
+        keep n_connections pooled connections hot for duration seconds by warming them up every interval seconds;
+        no new round is started later than duration seconds from now (none at all if duration <= 0) so that no
+        probe is in flight afterwards
+
+        returns the number of warm connections of every round, reported once at the end
+        '''
+        t_stop = time.monotonic() + duration
+        rounds = []
+        while time.monotonic() < t_stop:
+            rounds += [await self.warm_up(n_connections)]
+            if time.monotonic() + interval > t_stop:
+                break
+            await asyncio.sleep(interval)
+        if rounds:
+            print(f'warm connections: {min(rounds)} to {max(rounds)} in {len(rounds)} rounds')
+        return rounds
+
+    async def send(self, request: PreparedRequest) -> Dict:
+        '''
+        send a prepared request as it is
+        '''
+        return await self._request(request.method,request.url,data=request.body,headers=request.headers)
+
+    async def get_locations(self):
+        uri = self._create_locations_uri()
+        return await self._get(uri)
+
+    async def get_classes(self,
+                          location_id: int = 3,
+                          start_date: str = '2021-10-20T10:00:00',
+                          days: int = 1,
+                          use_cache: bool = True) -> List:
+        '''
+        classes at location_id for days starting from start_date; use_cache=False bypasses the schedule cache
+        and the schedule service
+
+        classes served by the schedule service may have been fetched by another account (see ScheduleService),
+        so they never go into the schedule cache of this one
+        '''
+        uri = self._create_classes_uri()
+        fields = self._classes_fields(location_id, start_date, days)
+
+        if use_cache:
+            classes = self._cached_classes(fields)
+            if classes is not None:
+                return classes
+
+        fetch = lambda: self._post(uri,data=self.codec.dumps(fields))
+        if use_cache and self.schedule_service is not None:
+            return await self.schedule_service.get(location_id, start_date, days, fetch)
+
+        classes = await fetch()
+        self._cache_classes(fields, classes)
+        return classes
+
+    async def get_class_records(self,
+                                location_id: int = 3,
+                                start_date: str = '2021-10-20T10:00:00',
+                                days: int = 1,
+                                use_cache: bool = True) -> List[ClassRecord]:
+        '''
+        same as get_classes but every class is projected onto a ClassRecord
+        '''
+        return parse_classes(await self.get_classes(location_id, start_date, days, use_cache))
+
+    async def get_active_reservations(self) -> List:
+        uri = self._create_list_reservations_uri(user_id = self.api_session_data['UserId'])
+        return await self._get(uri)
+
+    async def get_reservations_history(self) -> List:
+        uri = self._create_reservations_history_uri(user_id = self.api_session_data['UserId'])
+        return await self._get(uri)
+
+    async def add_reservation(self, class_id: int, date: str) -> Dict:
+        uri = self._create_add_reservation_uri()
+        fields = self._reservation_fields(class_id, date)
+
+        return await self._post(uri,data=self.codec.dumps(fields))
+
+    async def remove_reservation(self, class_id: int, date: str) -> Dict:
+        uri = self._create_remove_reservation_uri()
+        fields = self._reservation_fields(class_id, date)
+
+        return {"Status": await self._post(uri,data=self.codec.dumps(fields))}
+
+    async def login(self):
+        uri = self._create_login_uri()
+        data, h = self._login_data()
+
+        try:
+            response = await self._post(uri=uri,data=data.to_string(),headers=h)
+            self._logged_in(response)
+
+        except APIRequestException:
+            self.logged = False
+            raise RuntimeError('login FAILED... check auth file?')
+
+    async def restore_or_login(self):
+        if not self._restore_login():
+            await self.login()
@@ -0,0 +1,173 @@
+"""
+Transport-independent part of the Fitness Platinium Gym API clients
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+import random
+import string
+
+from .codec import JSONCodec, get_codec
+from .prepared import PreparedRequest
+from .schedule_cache import ScheduleCache
+from .session_cache import SessionCache
+
+if TYPE_CHECKING:
+    from requests_toolbelt import MultipartEncoder # imported by _login_data when a login needs it
+
+class BaseClient:
+    '''
+    transport-independent part of the API client: headers, URIs and request payloads
+
+    request bodies and responses are (de)serialized by codec (by default the fastest json library installed)
+    '''
+    BASE_URL = 'https://stats.fitnessplatinium.pl:13002/club-api'
+
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 session_cache: SessionCache = None,
+                 schedule_cache: ScheduleCache = None,
+                 codec: JSONCodec = None):
+        self.headers = self._init_headers()
+        self.username = username
+        self.password = password
+        self.session_cache = session_cache
+        self.schedule_cache = schedule_cache
+        self.codec = get_codec() if codec is None else codec
+
+        self.logged = False
+        self.access_token = None
+        self.api_session_data = None
+        self.token_lifetime = None # seconds, if the server reports it
+
+    def _init_headers(self) -> Dict:
+        headers = {
+            "accept": "application/json, text/plain, */*",
+            "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
+            "cache-control": "no-cache",
+            "content-type": "application/json",
+        #     "pragma": "no-cache",
+        #     "sec-ch-ua": "\"Chromium\";v=\"93\", \" Not;A Brand\";v=\"99\"",
+        #     "sec-ch-ua-mobile": "?0",
+        #     "sec-ch-ua-platform": "\"Linux\"",
+        #     "sec-fetch-dest": "empty",
+        #     "sec-fetch-mode": "cors",
+        #     "sec-fetch-site": "same-site"
+          }
+        return headers
+
+    def _create_classes_uri(self) -> str:
+        return self.BASE_URL+'/pl/classes'
+
+    def _create_locations_uri(self) -> str:
+        #return self.BASE_URL+'/pl/locations' alternative?
+        return self.BASE_URL+'/pl/locations/with-classes'
+
+    def _create_list_reservations_uri(self, user_id: int) -> str:
+        return self.BASE_URL+'/pl/classes/user-active-reservations/'+str(user_id)
+
+    def _create_reservations_history_uri(self, user_id: int) -> str:
+        return self.BASE_URL+'/pl/classes/user-reservations-history/'+str(user_id)
+
+    def _create_add_reservation_uri(self) -> str:
+        return self.BASE_URL+'/pl/classes/add-reservation'
+
+    def _create_remove_reservation_uri(self) -> str:
+        return self.BASE_URL+'/pl/classes/remove-reservation'
+
+    def _create_login_uri(self) -> str:
+        return self.BASE_URL+'/user-token'
+
+    def _classes_fields(self, location_id: int, start_date: str, days: int) -> Dict:
+        return {'LocationId':int(location_id),
+                'StartDate':start_date,
+                'Days':days,
+                'UserId':self.api_session_data['UserId']}
+
+    def _cached_classes(self, fields: Dict) -> Union[List,None]:
+        if self.schedule_cache is None:
+            return None
+        return self.schedule_cache.get(self._classes_cache_key(fields))
+
+    def _cache_classes(self, fields: Dict, classes: List) -> None:
+        if self.schedule_cache is not None:
+            self.schedule_cache.put(self._classes_cache_key(fields), classes)
+
+    def classes_fetched_at(self, location_id: int, start_date: str, days: int) -> Union[float,None]:
+        '''
+        time.time() when the cached classes of get_classes(location_id, start_date, days) were fetched;
+        None if they are not cached
+        '''
+        if self.schedule_cache is None:
+            return None
+        return self.schedule_cache.fetched_at(self._classes_cache_key(self._classes_fields(location_id, start_date, days)))
+
+    def _classes_cache_key(self, fields: Dict) -> str:
+        return ScheduleCache.key(fields['UserId'], fields['LocationId'], fields['StartDate'], fields['Days'])
+
+    def _reservation_fields(self, class_id: int, date: str) -> Dict:
+        return {"UserId": self.api_session_data['UserId'],
+                "Date": date, #StartTime from get_classes
+                "ClassScheduleId": class_id} #Id from get_classes
+
+    def prepare_add_reservation(self, class_id: int, date: str) -> PreparedRequest:
+        '''
+        add_reservation serialized for the current token; sent later with send()
+        '''
+        body = self.codec.dumps(self._reservation_fields(class_id, date))
+        if isinstance(body, str):
+            body = body.encode()
+        return PreparedRequest('POST', self._create_add_reservation_uri(), self.headers, body)
+
+    def _login_data(self) -> Tuple['MultipartEncoder',Dict]:
+        # only needed to log in (not when a cached session is restored) and pulls in requests
+        from requests_toolbelt import MultipartEncoder
+
+        print(f'logging in as: {self.username} ; len(password)={len(self.password)}')
+        if self.username == "" and self.password == "":
+            print('empty username and password; authfile is likely incorrect!')
+
+        h = self.headers.copy()
+        wfb_id =''.join(random.sample(string.ascii_letters+string.digits,16))
+
+        fields = {'login': self.username,
+                  'password': self.password,
+                  'facebookid': 'undefined'}
+
+        data = MultipartEncoder(fields=fields, boundary='----WebKitFormBoundary'+wfb_id)
+        h["content-type"] = data.content_type
+        return data, h
+
+    def _set_login(self, response: Dict) -> None:
+        # swap the headers in one assignment; requests in flight keep the old token
+        headers = self.headers.copy()
+        headers["authorization"] = 'Bearer '+ response['access_token']
+
+        self.access_token = response['access_token']
+        self.api_session_data = response['session']
+        self.token_lifetime = response.get('expires_in')
+        self.headers = headers
+        self.logged = True
+
+    def _logged_in(self, response: Dict) -> None:
+        self._set_login(response)
+        if self.session_cache is not None:
+            self.session_cache.save(self.username, response)
+        print('login SUCCESS.')
+        print("="*100)
+
+    def _restore_login(self) -> bool:
+        '''
+        reuse a still valid session from session_cache instead of logging in
+        '''
+        if self.session_cache is None:
+            return False
+        response = self.session_cache.load(self.username)
+        if response is None:
+            return False
+        self._set_login(response)
+        print(f'restored cached session of {self.username} (valid for {response["expires_in"]} sec)')
+        print("="*100)
+        return True
@@ -0,0 +1,53 @@
+"""
+JSON codecs of the API clients: request bodies and responses
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Any, Union
+
+import json
+
+class JSONCodec:
+    '''
+    standard library json
+    '''
+    name = 'json'
+
+    def dumps(self, obj: Any) -> Union[str,bytes]:
+        return json.dumps(obj)
+
+    def loads(self, data: Union[str,bytes]) -> Any:
+        return json.loads(data)
+
+class OrjsonCodec(JSONCodec):
+    '''
+    orjson (optional dependency); bodies are compact utf-8 bytes, decoding errors are ValueErrors as with json
+    '''
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj)
+
+    def loads(self, data: Union[str,bytes]) -> Any:
+        return self._orjson.loads(data)
+
+CODECS = {'json': JSONCodec,
+          'orjson': OrjsonCodec}
+
+def get_codec(name: str = None) -> JSONCodec:
+    '''
+    codec by name; None picks the fastest one installed (orjson, else the standard library)
+    '''
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError('unknown codec')
+        return CODECS[name]()
+
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JSONCodec()
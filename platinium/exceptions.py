@@ -9,10 +9,14 @@ class APIException(Exception):
         try:
             json_res = json.loads(text)
         except ValueError:
-            self.message = 'Invalid JSON error message from Platinium: {}'.format(response.text)
+            self.message = 'Invalid JSON error message from Platinium: {}'.format(text)
         else:
-            self.code = json_res['code']
-            self.message = json_res['msg']
+            # error bodies are not always {"code": ..., "msg": ...} (e.g. {"Message": ...} from a 5xx)
+            if isinstance(json_res, dict):
+                self.code = json_res.get('code', 0)
+                self.message = json_res.get('msg', text)
+            else:
+                self.message = text
         self.status_code = status_code
         self.response = response
         self.request = getattr(response, 'request', None)
@@ -0,0 +1,32 @@
+"""
+Requests serialized ahead of time and sent later without touching their payload
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Dict
+
+class PreparedRequest:
+    '''
+    ready-to-send request: method, url, headers and body bytes
+
+    headers is the client's header dict at preparation time; the client swaps (never mutates) it
+    on login, so token is the authorization header the request was prepared with
+    '''
+    __slots__ = ('method', 'url', 'headers', 'body')
+
+    def __init__(self,
+                 method: str,
+                 url: str,
+                 headers: Dict,
+                 body: bytes):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+
+    @property
+    def token(self) -> str:
+        return self.headers.get('authorization')
+
+    def __repr__(self):
+        return f'PreparedRequest({self.method} {self.url} {self.body!r})'
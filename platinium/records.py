@@ -0,0 +1,83 @@
+"""
+Compact records of API responses holding only the fields used by the booker and the reservations tool
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Dict, List, Tuple
+
+from datetime import datetime
+from operator import attrgetter, itemgetter
+
+# fields of a get_classes class kept by ClassRecord (the response has ~30 more: Trainers, Description, prices...)
+CLASS_FIELDS = ('StartTime',
+                'Name',
+                'Id',
+                'LocationId',
+                'DayOfWeek',
+                'IsReserved',
+                'IsReservable',
+                'IsEnabled',
+                'IsCanceled',
+                'ReservationButton')
+
+_get_fields = itemgetter(*CLASS_FIELDS)
+_get_attributes = attrgetter(*CLASS_FIELDS)
+
+class ClassRecord:
+    '''
+    class returned by get_classes reduced to CLASS_FIELDS; start is StartTime parsed into a datetime
+
+    fields are read as attributes or, like the response dicts, by key (record['Id'])
+    '''
+    __slots__ = CLASS_FIELDS + ('start',)
+
+    def __init__(self,
+                 StartTime: str,
+                 Name: str,
+                 Id: int,
+                 LocationId: int,
+                 DayOfWeek: int,
+                 IsReserved: bool,
+                 IsReservable: bool,
+                 IsEnabled: bool,
+                 IsCanceled: bool,
+                 ReservationButton: int):
+        self.StartTime = StartTime
+        self.Name = Name
+        self.Id = Id
+        self.LocationId = LocationId
+        self.DayOfWeek = DayOfWeek
+        self.IsReserved = IsReserved
+        self.IsReservable = IsReservable
+        self.IsEnabled = IsEnabled
+        self.IsCanceled = IsCanceled
+        self.ReservationButton = ReservationButton
+        self.start = datetime.fromisoformat(StartTime)
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'ClassRecord':
+        return cls(*_get_fields(d))
+
+    def __getitem__(self, field: str):
+        if field not in CLASS_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field: str) -> bool:
+        return field in CLASS_FIELDS
+
+    def to_tuple(self) -> Tuple:
+        return _get_attributes(self)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ClassRecord) and self.to_tuple() == other.to_tuple()
+
+    def __repr__(self):
+        return f'ClassRecord({", ".join(f"{field}={getattr(self, field)!r}" for field in CLASS_FIELDS)})'
+
+def parse_classes(classes: List[Dict]) -> List[ClassRecord]:
+    '''
+    project a get_classes response onto ClassRecords
+    '''
+    from_dict = ClassRecord.from_dict
+    return [from_dict(d) for d in classes]
@@ -0,0 +1,128 @@
+"""
+Cache of get_classes responses with TTL, LRU eviction and an optional on-disk store
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import List, Union
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+class ScheduleCache:
+    '''
+    get_classes responses keyed by (user id, location id, start date, days)
+
+    entries older than ttl seconds are refetched; at most max_entries are kept, least recently used ones
+    are evicted first; with a path every entry is also stored as a json file in that directory so that
+    it survives restarts and is shared between processes
+    '''
+
+    def __init__(self,
+                 path: Union[str,None] = 'schedule_cache',
+                 ttl: float = 600.,
+                 max_entries: int = 256):
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict() # key -> (fetch time, classes), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+            self._prune_disk()
+
+    @staticmethod
+    def key(user_id: int, location_id: int, start_date: str, days: int) -> str:
+        return json.dumps([user_id, int(location_id), start_date, days])
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def _load_disk(self, key: str) -> Union[tuple,None]:
+        try:
+            with open(self._file(key),'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry['fetched_at'], entry['classes']
+
+    @staticmethod
+    def _remove(file: str) -> None:
+        # other processes prune the same directory
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+    def _prune_disk(self) -> None:
+        # drop expired files and keep the max_entries most recently used ones
+        files = []
+        for name in os.listdir(self.path):
+            file = os.path.join(self.path, name)
+            if name.endswith('.json'):
+                try:
+                    files += [(os.path.getmtime(file), file)]
+                except FileNotFoundError:
+                    pass
+        files.sort(reverse=True)
+        for i, (mtime, file) in enumerate(files):
+            if i >= self.max_entries or time.time() - mtime > self.ttl:
+                self._remove(file)
+
+    def _write_disk(self, key: str, entry: dict) -> None:
+        # a unique temporary file since other processes may store the same key
+        fd, tmp_file = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd,'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_file, self._file(key))
+        except BaseException:
+            self._remove(tmp_file)
+            raise
+
+    def get(self, key: str) -> Union[List,None]:
+        entry = self._entries.get(key)
+        if entry is None and self.path is not None:
+            entry = self._load_disk(key)
+
+        if entry is None or time.time() - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def fetched_at(self, key: str) -> Union[float,None]:
+        '''
+        time.time() when the classes of key held in memory were fetched; None if there are none
+        '''
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key: str, classes: List) -> None:
+        fetched_at = time.time()
+        self._entries[key] = (fetched_at, classes)
+        self._entries.move_to_end(key)
+
+        if self.path is not None:
+            try:
+                self._write_disk(key, {'key': key, 'fetched_at': fetched_at, 'classes': classes})
+            except OSError as e:
+                # the entry stays in memory; a fetch never fails on the cache
+                print(f'could not store classes in {self.path}: {e}')
+
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            if self.path is not None:
+                self._remove(self._file(old_key))
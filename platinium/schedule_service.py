@@ -0,0 +1,94 @@
+"""
+get_classes fetches shared by the clients of several accounts in one process
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+
+import asyncio
+import time
+
+class ScheduleService:
+    '''
+    single-flight get_classes keyed by (location id, start date, days): concurrent requests for the same key
+    wait for one fetch and its result is reused for ttl seconds, whichever account asks
+
+    the per-user fields of a shared result (IsReserved, ReservationButton, IsWaitingList, WaitingListPosition,
+    IsFavorite, IsConstantReservation, ...) are those of the account which fetched it: the comparisons of the
+    other accounts see them (e.g. correct_IsReservable), so their reservability flags are only indicative;
+    shared results are never written to a per-user schedule cache and failed reservations are diagnosed from
+    classes refetched by their own account (use_cache=False)
+    '''
+
+    def __init__(self, ttl: float = 60.):
+
+        self.ttl = ttl
+        self._inflight = dict() # key -> future of the running fetch
+        self._recent = dict() # key -> (fetch time, classes)
+
+        self.fetches = 0
+        self.hits = 0 # served from a recent fetch
+        self.joined = 0 # served by waiting for a running fetch
+
+    @staticmethod
+    def key(location_id: int, start_date: str, days: int) -> Tuple:
+        return int(location_id), start_date, days
+
+    def _get_recent(self, key: Tuple) -> Union[List,None]:
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._recent[key]
+            return None
+        return entry[1]
+
+    async def get(self,
+                  location_id: int,
+                  start_date: str,
+                  days: int,
+                  fetch: Callable[[], Awaitable[List]]) -> List:
+        '''
+        classes of (location_id, start_date, days); fetch() is awaited only if no fetch of them is running
+        or recent
+        '''
+        key = self.key(location_id, start_date, days)
+        while True:
+            classes = self._get_recent(key)
+            if classes is not None:
+                self.hits += 1
+                return classes
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                classes = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise # this request was cancelled
+                continue # the running fetch was cancelled; try again
+            self.joined += 1
+            return classes
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.fetches += 1
+        try:
+            classes = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # waiters re-raise it; never reported as unretrieved
+            raise
+        else:
+            self._recent[key] = (time.monotonic(), classes)
+            future.set_result(classes)
+        finally:
+            del self._inflight[key]
+        return classes
+
+    def stats(self) -> Dict:
+        return {'fetches': self.fetches, 'hits': self.hits, 'joined': self.joined}
@@ -0,0 +1,93 @@
+"""
+On-disk cache of logged-in sessions shared between processes
+.. moduleauthor:: Jacek Grela
+"""
+
+from typing import Dict, Union
+
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError: # not on Windows; saves are then not serialized between processes
+    fcntl = None
+
+class SessionCache:
+    '''
+    json file with the login response (access token, session data, expiry) of every username
+
+    entries are reused while they are valid for at least margin more seconds; when the server does not
+    report the token lifetime it is assumed to be default_lifetime seconds
+
+    saves of several processes are serialized by a lock file next to the cache
+    '''
+
+    def __init__(self,
+                 path: str = 'session_cache.json',
+                 default_lifetime: int = 3000,
+                 margin: int = 300):
+
+        self.path = path
+        self.default_lifetime = default_lifetime
+        self.margin = margin
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path,'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def load(self, username: str) -> Union[Dict,None]:
+        '''
+        cached login response of username with expires_in set to the remaining lifetime; None if missing or expired
+        '''
+        entry = self._read().get(username)
+        if entry is None:
+            return None
+
+        expires_in = entry['expires_at'] - time.time()
+        if expires_in < self.margin:
+            return None
+
+        return {'access_token': entry['access_token'],
+                'session': entry['session'],
+                'expires_in': int(expires_in)}
+
+    def save(self, username: str, response: Dict) -> bool:
+        '''
+        store the login response of username; a failed write is reported and never raises
+        '''
+        lifetime = response.get('expires_in')
+        if lifetime is None:
+            lifetime = self.default_lifetime
+        entry = {'access_token': response['access_token'],
+                 'session': response['session'],
+                 'expires_at': time.time() + lifetime}
+
+        try:
+            with open(self.path + '.lock','a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX) # released when the file is closed
+                cache = self._read()
+                cache[username] = entry
+                self._write(cache)
+        except OSError as e:
+            print(f'could not save session of {username} to {self.path}: {e}')
+            return False
+        return True
+
+    def _write(self, cache: Dict) -> None:
+        # write atomically through a unique temporary file, readable by the owner only (mkstemp); the file holds access tokens
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix=os.path.basename(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd,'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
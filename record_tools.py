@@ -0,0 +1,222 @@
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+from platinium.records import CLASS_FIELDS, ClassRecord
+
+# pure-python counterpart of the DataFrame pipeline of reserve_tools (transform_dfs, sort_dfs,
+# form_candidate_pairs, extract_matches, index_matches) working on lists of __slots__ records; for the tens to
+# hundreds of classes of a schedule it skips the per-operation overhead of pandas and does not import it
+
+DAYOFWEEK = {'SUN':0,'MON':1,'TUE':2,'WED':3,'THU':4,'FRI':5,'SAT':6} # as reserve_tools.weekday_to_DayOfWeek
+WEEKDAY = {dow: weekday for weekday, dow in DAYOFWEEK.items()}
+
+OWN_CLASSES_KEYS = ('location_id', 'class_name', 'class_id', 'class_time')
+ONLINE_CLASSES_KEYS = CLASS_FIELDS
+_get_online_fields = itemgetter(*ONLINE_CLASSES_KEYS)
+
+class OwnClass:
+    '''
+    own class (a row of classes_df); DayOfWeek is the weekday name until transform_records
+    '''
+    __slots__ = ('own_id', 'LocationId', 'Name', 'Id', 'StartTime', 'DayOfWeek')
+
+    def __init__(self, own_id, LocationId, Name, Id, StartTime, DayOfWeek):
+        self.own_id = own_id
+        self.LocationId = LocationId
+        self.Name = Name
+        self.Id = Id
+        self.StartTime = StartTime
+        self.DayOfWeek = DayOfWeek
+
+    def __repr__(self):
+        return f'OwnClass({", ".join(f"{k}={getattr(self,k)!r}" for k in self.__slots__)})'
+
+class OnlineClass:
+    '''
+    online class (a row of online_classes_df) from a get_classes dict or a ClassRecord; abs_time keeps the
+    absolute StartTime after transform_records and start its datetime (if already parsed by the ClassRecord)
+    '''
+    __slots__ = ('online_id', 'abs_time', 'start') + ONLINE_CLASSES_KEYS
+
+    def __init__(self, online_id, cls):
+        self.online_id = online_id
+        if isinstance(cls, ClassRecord):
+            values, self.start = cls.to_tuple(), cls.start
+        else:
+            values, self.start = _get_online_fields(cls), None
+        for key, value in zip(ONLINE_CLASSES_KEYS, values):
+            setattr(self, key, value)
+        self.abs_time = self.StartTime
+
+    def __repr__(self):
+        return f'OnlineClass({", ".join(f"{k}={getattr(self,k)!r}" for k in self.__slots__)})'
+
+class ClassPair:
+    '''
+    comparison flags of an (own, online) pair (a row of candidate_pairs_df)
+    '''
+    __slots__ = ('own_id', 'online_id',
+                 'correct_StartTime', 'correct_DayOfWeek', 'correct_Id', 'correct_Name', 'correct_LocationId',
+                 'correct_IsCanceled', 'correct_IsReservable', 'correct_IsEnabled')
+
+    def __init__(self, own: OwnClass, online: OnlineClass):
+        self.own_id = own.own_id
+        self.online_id = online.online_id
+        self.correct_StartTime = own.StartTime == online.StartTime
+        self.correct_DayOfWeek = own.DayOfWeek == online.DayOfWeek
+        self.correct_Id = own.Id == online.Id
+        self.correct_Name = own.Name == online.Name
+        self.correct_LocationId = own.LocationId == online.LocationId
+        self.correct_IsCanceled = online.IsCanceled == False
+        self.correct_IsReservable = online.IsReservable == True and online.ReservationButton != 0
+        self.correct_IsEnabled = online.IsEnabled == True
+
+    def is_basic(self) -> bool:
+        return (self.correct_StartTime or self.correct_Id or self.correct_Name) and self.correct_DayOfWeek
+
+    def is_exact(self) -> bool:
+        # correct_IsReservable is left out as in reserve_tools.extract_matches
+        return (self.correct_StartTime and self.correct_DayOfWeek and self.correct_Id and self.correct_Name
+                and self.correct_LocationId and self.correct_IsCanceled and self.correct_IsEnabled)
+
+    def __repr__(self):
+        return f'ClassPair({", ".join(f"{k}={getattr(self,k)!r}" for k in self.__slots__)})'
+
+def generate_own_classes(classes: Dict) -> List[OwnClass]:
+    '''
+    records of generate_own_classes_df
+    '''
+    out = []
+    for weekday, wd_cl in classes.items():
+        if not isinstance(wd_cl,list):
+            raise ValueError('wrong classes format')
+        for cl in wd_cl:
+            if not all (k in cl for k in OWN_CLASSES_KEYS):
+                raise ValueError('wrong classes format')
+            out += [OwnClass(len(out), int(cl['location_id']), str(cl['class_name']), int(cl['class_id']),
+                             str(cl['class_time']), str(weekday))]
+    return out
+
+def extract_location_ids(classes: List[OwnClass]) -> List:
+    '''
+    location ids of own classes in the order of first appearance
+    '''
+    return list(dict.fromkeys(cls.LocationId for cls in classes))
+
+def online_classes_to_records(out: List) -> List[OnlineClass]:
+    '''
+    records of online_classes_to_df
+    '''
+    if out and not all (k in out[0] for k in ONLINE_CLASSES_KEYS):
+        raise KeyError('unknown name in cols')
+    return [OnlineClass(i, cls) for i, cls in enumerate(out)]
+
+def transform_records(classes: List[OwnClass],
+                      online_classes: List[OnlineClass]) -> Tuple[List[OwnClass],List[OnlineClass]]:
+    '''
+    same as transform_dfs: weekday names become DayOfWeek ints and StartTime is cast into hh:mm format
+    '''
+    for cls in classes:
+        if cls.DayOfWeek not in DAYOFWEEK:
+            raise ValueError('unknown weekday')
+        cls.DayOfWeek = DAYOFWEEK[cls.DayOfWeek]
+    for cls in online_classes:
+        if cls.start is None:
+            cls.start = datetime.fromisoformat(cls.abs_time)
+        cls.StartTime = f'{cls.start.hour:02d}:{cls.start.minute:02d}'
+    return classes, online_classes
+
+def sort_records(classes: List[OwnClass],
+                 online_classes: List[OnlineClass]) -> Tuple[List[OwnClass],List[OnlineClass]]:
+    '''
+    same as sort_dfs: online classes in chronological order, own classes of the weekdays present online
+    sorted by weekday (in the order they appear online) and class time; online classes starting at the same
+    time keep their order (sort_dfs leaves it unspecified)
+    '''
+    online_classes = sorted(online_classes, key=lambda cls: cls.abs_time)
+
+    dow_rank = dict()
+    for cls in online_classes:
+        dow_rank.setdefault(cls.DayOfWeek, len(dow_rank))
+
+    classes = sorted((cls for cls in classes if cls.DayOfWeek in dow_rank),
+                     key=lambda cls: (dow_rank[cls.DayOfWeek], cls.StartTime))
+    return classes, online_classes
+
+def form_candidate_pairs(classes: List[OwnClass],
+                         online_classes: List[OnlineClass]) -> List[ClassPair]:
+    '''
+    every own class compared with every online class, in the order of classes and online_classes
+    '''
+    return [ClassPair(own, online) for own in classes for online in online_classes]
+
+def extract_matches(candidate_pairs: List[ClassPair]) -> Tuple[List[ClassPair],List[ClassPair]]:
+    '''
+    basic and exact matches among candidate_pairs (see reserve_tools.extract_matches)
+    '''
+    return ([pair for pair in candidate_pairs if pair.is_basic()],
+            [pair for pair in candidate_pairs if pair.is_exact()])
+
+def index_matches(classes: List[OwnClass],
+                  online_classes: List[OnlineClass]) -> Tuple[List[ClassPair],List[ClassPair]]:
+    '''
+    same matches as extract_matches(form_candidate_pairs(...)) from the pairs found by probing hash indexes
+    on (DayOfWeek, StartTime), (DayOfWeek, Id) and (DayOfWeek, Name) of online_classes
+    '''
+    indexes = {key: dict() for key in ('StartTime','Id','Name')}
+    for pos, cls in enumerate(online_classes):
+        for key, index in indexes.items():
+            index.setdefault((cls.DayOfWeek, getattr(cls,key)),[]).append(pos)
+
+    candidate_pairs = []
+    for own in classes:
+        matches = set()
+        for key, index in indexes.items():
+            matches.update(index.get((own.DayOfWeek, getattr(own,key)),[]))
+        candidate_pairs += [ClassPair(own, online_classes[pos]) for pos in sorted(matches)]
+
+    return extract_matches(candidate_pairs)
+
+def print_verbose(classes: List[OwnClass],
+                  online_classes: List[OnlineClass],
+                  basic_matches: List[ClassPair],
+                  exact_matches: List[ClassPair]) -> None:
+
+    own_by_id = {cls.own_id: cls for cls in classes}
+    online_by_id = {cls.online_id: cls for cls in online_classes}
+    exact = {pair.own_id: pair.online_id for pair in exact_matches}
+
+    matched = dict()
+    for pair in basic_matches:
+        matched.setdefault(pair.own_id,[]).append(pair.online_id)
+
+    for own_id, online_ids in matched.items():
+        if own_id in exact:
+            online_ids = [exact[own_id]]
+        print('-'*80)
+        date = datetime.fromisoformat(online_by_id[online_ids[0]].abs_time)
+        print(f'{date.strftime("%A %d. %B %Y")}')
+        print('-'*80)
+        print(own_by_id[own_id])
+        print('---')
+        for online_id in online_ids:
+            print(online_by_id[online_id])
+
+def print_nonverbose(classes: List[OwnClass],
+                     online_classes: List[OnlineClass],
+                     exact_matches: List[ClassPair]) -> None:
+
+    abs_times = {cls.online_id: cls.abs_time for cls in online_classes}
+    exact = {pair.own_id: pair.online_id for pair in exact_matches}
+
+    header = ['own_id', 'LocationId', 'Name', 'Id', 'StartTime', 'DayOfWeek', 'platinium match']
+    rows = []
+    for cls in classes:
+        start_time = abs_times[exact[cls.own_id]] if cls.own_id in exact else cls.StartTime
+        rows += [[cls.own_id, cls.LocationId, cls.Name, cls.Id, start_time, WEEKDAY[cls.DayOfWeek],
+                  'YES' if cls.own_id in exact else 'NO']]
+
+    widths = [max(len(str(row[i])) for row in [header]+rows) for i in range(len(header))]
+    for row in [header]+rows:
+        print('  '.join(str(v).rjust(w) for v, w in zip(row, widths)))
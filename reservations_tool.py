@@ -3,7 +3,7 @@ import json
 import webbrowser
 import os
 
-from platinium import Client
+from platinium import Client, ScheduleCache, SessionCache
 from html_tools import generate_html
 
 if __name__ == "__main__":
@@ -11,7 +11,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument('--authfile', type=str, default='auth.json')
+    parser.add_argument('--session_cache', type=str, default='session_cache.json', help='file caching logged-in sessions between runs (empty string disables)')
+    parser.add_argument('--schedule_cache', type=str, default='schedule_cache', help='directory caching fetched class schedules (empty string disables)')
+    parser.add_argument('--schedule_ttl', type=float, default=600., help='time (sec) after which cached class schedules are refetched')
+    parser.add_argument('--tab_cache', type=str, default='reservations_tool_tabs.json', help='file caching rendered location tabs between regenerations (empty string disables)')
     parser.add_argument('--overwrite_html',const=True,action='store_const',default=False,help='forcefully recreates reservations tool html file')
+    parser.add_argument('--lazy_html',const=True,action='store_const',default=False,help='embed schedules as compact json rendered on selection instead of html tables (smaller and faster to open with many locations)')
     # parser.add_argument('--reservefile', type=str, default='reservations.json')
     # parser.add_argument('--week_ahead', type=int, default=1)
     # parser.add_argument('--verbose', const=True, action='store_const', default=False)
@@ -27,8 +32,17 @@ if __name__ == "__main__":
         username = d['username']
         password = d['password']
 
-        client = Client(username=username,password=password,auto_log=True)
-
-        generate_html(client,html_file=toolpath)
+        session_cache = SessionCache(args.session_cache) if args.session_cache else None
+        schedule_cache = ScheduleCache(args.schedule_cache, ttl=args.schedule_ttl) if args.schedule_cache else None
+        client = Client(username=username,
+                        password=password,
+                        auto_log=True,
+                        session_cache=session_cache,
+                        schedule_cache=schedule_cache)
+
+        generate_html(client,
+                      html_file=toolpath,
+                      tab_cache_file=args.tab_cache if args.tab_cache else None,
+                      lazy=args.lazy_html)
     
     webbrowser.open_new_tab(f'file://{os.path.realpath(toolpath)}')
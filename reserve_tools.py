@@ -1,12 +1,16 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime,timedelta
 import json
+import time
 import numpy as np
 import pandas as pd
 from pandas import DataFrame, Series
 
 from typing import List, Tuple, Dict, Union
 
-from platinium import Client
+from platinium import Client, AsyncClient, CLASS_FIELDS, ClassRecord, parse_classes
+import record_tools
 
 
 WEEKDAY_NAMES = ['SUN','MON','TUE','WED','THU','FRI','SAT']
@@ -36,18 +40,40 @@ ONLINE_CLASSES_INDEX = 'online_id'
 class CompareClasses:
     
     def __init__(self,
-                 client: Client,
-                 classes: Dict):
+                 client: Union[Client,AsyncClient],
+                 classes: Dict,
+                 matcher: str = 'pairs',
+                 backend: str = 'pandas'):
+        '''
+        matcher is either 'pairs' (compare all own x online pairs) or 'index' (hash-indexed lookup of matches)
+
+        backend is either 'pandas' (DataFrames in classes_df, online_classes_df, ...) or 'records' (lists of
+        record_tools records in classes, online_classes, ...; faster for schedules of up to a few thousand classes)
+        '''
+        if matcher not in ('pairs','index'):
+            raise ValueError('unknown matcher')
+        if backend not in ('pandas','records'):
+            raise ValueError('unknown backend')
         
         self.client = client
         self.classes_dict = classes
+        self.matcher = matcher
+        self.backend = backend
         self.classes_df = None
         self.online_classes_df = None
         self.candidate_pairs_df = None
         self.basic_matches_df = None
         self.exact_matches_df = None
+
+        # records backend
+        self.classes = None
+        self.online_classes = None
+        self.candidate_pairs = None
+        self.basic_matches = None
+        self.exact_matches = None
         
         self.abs_times = None # absolute StartTimes
+        self.t_fetched = None # time.time() when the online classes were fetched
         self.location_ids = None # a list of LocationIds
         
         self.week_ahead = None
@@ -65,14 +91,60 @@ class CompareClasses:
     
     def _generate_dfs(self) -> None:
         
+        if self.backend == 'records':
+            self.classes = record_tools.generate_own_classes(self.classes_dict)
+            self.location_ids = record_tools.extract_location_ids(self.classes)
+            self.t_fetched = time.time()
+            self._process_records(fetch_online_classes(self.client,
+                                                       self.location_ids,
+                                                       self.start_date,
+                                                       self.days_ahead))
+            return
+
         self.classes_df = generate_own_classes_df(self.classes_dict)
         self.location_ids = extract_location_ids(self.classes_df)
 
+        self.t_fetched = time.time()
         self.online_classes_df = generate_online_classes_df(self.client,
                                                             self.location_ids,
                                                             self.start_date,
                                                             self.days_ahead)
-        
+        self._process_dfs()
+
+    async def _agenerate_dfs(self) -> None:
+        '''
+        same as _generate_dfs but fetches online classes through an AsyncClient
+        '''
+        if self.backend == 'records':
+            self.classes = record_tools.generate_own_classes(self.classes_dict)
+            self.location_ids = record_tools.extract_location_ids(self.classes)
+            self.t_fetched = time.time()
+            self._process_records(await afetch_online_classes(self.client,
+                                                              self.location_ids,
+                                                              self.start_date,
+                                                              self.days_ahead))
+            return
+
+        self.classes_df = generate_own_classes_df(self.classes_dict)
+        self.location_ids = extract_location_ids(self.classes_df)
+
+        self.t_fetched = time.time()
+        self.online_classes_df = await agenerate_online_classes_df(self.client,
+                                                                   self.location_ids,
+                                                                   self.start_date,
+                                                                   self.days_ahead)
+        self._process_dfs()
+
+    def _process_records(self, out: List) -> None:
+
+        self.online_classes = record_tools.online_classes_to_records(out)
+        self.classes, self.online_classes = record_tools.transform_records(self.classes,
+                                                                           self.online_classes)
+        self.classes, self.online_classes = record_tools.sort_records(self.classes,
+                                                                      self.online_classes)
+
+    def _process_dfs(self) -> None:
+
         self.abs_times = self.online_classes_df['StartTime'].copy()
         
         self.classes_df, self.online_classes_df = transform_dfs(self.classes_df,
@@ -83,6 +155,22 @@ class CompareClasses:
                                                            self.abs_times)
         
     def _generate_matches(self) -> None:
+
+        if self.backend == 'records':
+            if self.matcher == 'index':
+                self.candidate_pairs = None
+                self.basic_matches, self.exact_matches = record_tools.index_matches(self.classes,
+                                                                                    self.online_classes)
+            else:
+                self.candidate_pairs = record_tools.form_candidate_pairs(self.classes, self.online_classes)
+                self.basic_matches, self.exact_matches = record_tools.extract_matches(self.candidate_pairs)
+            return
+
+        if self.matcher == 'index':
+            self.candidate_pairs_df = None
+            self.basic_matches_df, self.exact_matches_df = index_matches(self.classes_df,
+                                                                         self.online_classes_df)
+            return
         
         self.classes_df, self.online_classes_df, self.candidate_pairs_df = form_candidate_pairs(self.classes_df,
                                                                                                 self.online_classes_df)   
@@ -90,8 +178,30 @@ class CompareClasses:
                                                                        self.online_classes_df,
                                                                        self.candidate_pairs_df)
     
+    def online_class_records(self) -> List[ClassRecord]:
+        '''
+        online classes of the last comparison as ClassRecords with their absolute StartTimes (either backend)
+        '''
+        if self.backend == 'records':
+            if self.online_classes is None:
+                return []
+            return [ClassRecord(cls.abs_time, *(getattr(cls, k) for k in CLASS_FIELDS[1:])) for cls in self.online_classes]
+
+        if self.online_classes_df is None:
+            return []
+        df = self.online_classes_df.loc[:, list(CLASS_FIELDS)]
+        df['StartTime'] = self.abs_times.loc[df.index]
+        return [ClassRecord(*row) for row in df.itertuples(index=False)]
+
     def _print_verbose(self) -> None:
         
+        if self.backend == 'records':
+            record_tools.print_verbose(self.classes,
+                                       self.online_classes,
+                                       self.basic_matches,
+                                       self.exact_matches)
+            return
+
         print_verbose(self.classes_df,
                       self.online_classes_df,
                       self.basic_matches_df,
@@ -100,6 +210,12 @@ class CompareClasses:
     
     def _print_nonverbose(self) -> None:
         
+        if self.backend == 'records':
+            record_tools.print_nonverbose(self.classes,
+                                          self.online_classes,
+                                          self.exact_matches)
+            return
+
         print_nonverbose(self.classes_df,
                          self.exact_matches_df,
                          self.abs_times)
@@ -171,18 +287,112 @@ def generate_online_classes_df(client : Client,
                                location_ids : List, 
                                date : datetime, 
                                days_forward : int = 7,
-                               cols : List = ONLINE_CLASSES_COLUMNS) -> DataFrame:
+                               cols : List = ONLINE_CLASSES_COLUMNS,
+                               max_workers : int = 8,
+                               allow_partial : bool = False) -> DataFrame:
+    '''
+    generate dataframe of online classes starting from start_date up to days_forward days;
+    locations are fetched concurrently by at most max_workers threads
+    '''
+    # unused fields are dropped as soon as a location is fetched unless cols asks for them
+    slim = all (k in CLASS_FIELDS for k in cols)
+    out = fetch_online_classes(client, location_ids, date, days_forward, max_workers, allow_partial, slim)
+    return online_classes_to_df(out, cols)
+
+def fetch_online_classes(client : Client,
+                         location_ids : List,
+                         date : datetime,
+                         days_forward : int = 7,
+                         max_workers : int = 8,
+                         allow_partial : bool = False,
+                         slim : bool = True) -> List:
+    '''
+    online classes (as returned by get_classes) of location_ids, fetched concurrently by at most max_workers threads;
+    with slim the classes of every location are projected onto ClassRecords as soon as they arrive
+    '''
+    def fetch(lid):
+        classes = client.get_classes(location_id=lid,
+                                     start_date=date.isoformat(),
+                                     days=days_forward)
+        return parse_classes(classes) if slim else classes
+
+    with ThreadPoolExecutor(max_workers=max(min(max_workers,len(location_ids)),1)) as executor:
+        futures = [executor.submit(fetch,lid) for lid in location_ids]
+        results = []
+        for future in futures:
+            try:
+                results += [future.result()]
+            except Exception as e:
+                results += [e]
+
+    return collect_online_classes(location_ids, results, allow_partial)
+
+async def agenerate_online_classes_df(client : AsyncClient,
+                                      location_ids : List,
+                                      date : datetime,
+                                      days_forward : int = 7,
+                                      cols : List = ONLINE_CLASSES_COLUMNS,
+                                      max_workers : int = 8,
+                                      allow_partial : bool = False) -> DataFrame:
+    '''
+    asynchronous counterpart of generate_online_classes_df; at most max_workers requests are in flight
+    '''
+    slim = all (k in CLASS_FIELDS for k in cols)
+    out = await afetch_online_classes(client, location_ids, date, days_forward, max_workers, allow_partial, slim)
+    return online_classes_to_df(out, cols)
+
+async def afetch_online_classes(client : AsyncClient,
+                                location_ids : List,
+                                date : datetime,
+                                days_forward : int = 7,
+                                max_workers : int = 8,
+                                allow_partial : bool = False,
+                                slim : bool = True) -> List:
+    '''
+    asynchronous counterpart of fetch_online_classes
+    '''
+    semaphore = asyncio.Semaphore(max(max_workers,1))
+
+    async def fetch(lid):
+        async with semaphore:
+            classes = await client.get_classes(location_id=lid,
+                                               start_date=date.isoformat(),
+                                               days=days_forward)
+        return parse_classes(classes) if slim else classes
+
+    results = await asyncio.gather(*[fetch(lid) for lid in location_ids], return_exceptions=True)
+
+    return collect_online_classes(location_ids, results, allow_partial)
+
+def collect_online_classes(location_ids : List,
+                           results : List,
+                           allow_partial : bool = False) -> List:
     '''
-    generate dataframe of online classes starting from start_date up to days_forward days
+    concatenate per-location get_classes results (in the order of location_ids); failed fetches are reported
+    and raise a RuntimeError unless allow_partial
     '''
     out = []
+    failed = []
+    for lid, res in zip(location_ids, results):
+        if isinstance(res, Exception):
+            print(f'fetching classes for location_id={lid} failed: {res}')
+            failed += [lid]
+        else:
+            out += res
 
-    for lid in location_ids:
-        out += client.get_classes(location_id=lid,
-                                 start_date=date.isoformat(),
-                                 days=days_forward)
-    
-    online_classes_df = pd.DataFrame(out)
+    if failed and not allow_partial:
+        raise RuntimeError(f'fetching classes failed for location_ids {failed}')
+    return out
+
+def online_classes_to_df(out : List,
+                         cols : List = ONLINE_CLASSES_COLUMNS) -> DataFrame:
+    '''
+    build online_classes_df from a list of classes returned by get_classes (or of their ClassRecords)
+    '''
+    if out and isinstance(out[0], ClassRecord):
+        online_classes_df = pd.DataFrame.from_records([cls.to_tuple() for cls in out], columns=CLASS_FIELDS)
+    else:
+        online_classes_df = pd.DataFrame(out)
     online_classes_df = online_classes_df.reset_index()
     online_classes_df = online_classes_df.drop(labels=['index'],axis=1)
     online_classes_df.index.name = ONLINE_CLASSES_INDEX
@@ -237,43 +447,92 @@ def sort_dfs(classes_df: DataFrame,
 
 def form_candidate_pairs(classes_df : DataFrame, 
                          online_classes_df: DataFrame) -> Tuple[DataFrame,DataFrame,DataFrame]:
-    
-    
-    candidate_pairs_df = pd.DataFrame(columns=[OWN_CLASSES_INDEX,
-                                               ONLINE_CLASSES_INDEX,
-                                               'correct_StartTime',
-                                               'correct_DayOfWeek',
-                                               'correct_Id',
-                                               'correct_Name',
-                                               'correct_LocationId',
-                                               'correct_IsCanceled',
-                                               'correct_IsReservable',
-                                               'correct_IsEnabled'])
-    
-    for i, cls_own in classes_df.iterrows():
-        for j, cls_online in online_classes_df.iterrows():
-
-            rec = {OWN_CLASSES_INDEX: i,
-                   ONLINE_CLASSES_INDEX: j,
-                   'correct_StartTime': cls_online['StartTime'] == cls_own['StartTime'],
-                   'correct_DayOfWeek': cls_online['DayOfWeek'] == cls_own['DayOfWeek'],
-                   'correct_Id': cls_online['Id'] == cls_own['Id'],
-                   'correct_Name': cls_online['Name'] == cls_own['Name'],
-                   'correct_LocationId': cls_online['LocationId'] == cls_own['LocationId'],
-                   'correct_IsCanceled': cls_online['IsCanceled'] == False,
-                   'correct_IsReservable': (cls_online['IsReservable'] == True and cls_online['ReservationButton'] != 0),
-                   'correct_IsEnabled': cls_online['IsEnabled'] == True}
-            
-            candidate_pairs_df = candidate_pairs_df.append(rec,ignore_index=True)
-    
-    candidate_pairs_df = candidate_pairs_df.set_index([OWN_CLASSES_INDEX,ONLINE_CLASSES_INDEX])
+    '''
+    compare every own class with every online class; rows of candidate_pairs_df are indexed by (own_id, online_id)
+    in the order of classes_df and online_classes_df
+    '''
+    n_own = classes_df.shape[0]
+    n_online = online_classes_df.shape[0]
+
+    own_pos = np.repeat(np.arange(n_own),n_online)
+    online_pos = np.tile(np.arange(n_online),n_own)
+    candidate_pairs_df = pair_flags(classes_df, online_classes_df, own_pos, online_pos)
+        
+    return classes_df, online_classes_df, candidate_pairs_df
+
+def pair_flags(classes_df : DataFrame,
+               online_classes_df: DataFrame,
+               own_pos: np.ndarray,
+               online_pos: np.ndarray) -> DataFrame:
+    '''
+    comparison flags of the (own, online) pairs given by positions own_pos[k], online_pos[k] in classes_df, online_classes_df
+    '''
+    def pairwise(col):
+        return classes_df[col].to_numpy()[own_pos] == online_classes_df[col].to_numpy()[online_pos]
+
+    def online_only(flags):
+        return np.asarray(flags,dtype=bool)[online_pos]
+
+    index = pd.MultiIndex.from_arrays([classes_df.index.to_numpy().astype(np.int64)[own_pos],
+                                       online_classes_df.index.to_numpy().astype(np.int64)[online_pos]],
+                                      names=[OWN_CLASSES_INDEX,ONLINE_CLASSES_INDEX])
+
+    candidate_pairs_df = pd.DataFrame({'correct_StartTime': pairwise('StartTime'),
+                                       'correct_DayOfWeek': pairwise('DayOfWeek'),
+                                       'correct_Id': pairwise('Id'),
+                                       'correct_Name': pairwise('Name'),
+                                       'correct_LocationId': pairwise('LocationId'),
+                                       'correct_IsCanceled': online_only(online_classes_df['IsCanceled'] == False),
+                                       'correct_IsReservable': online_only((online_classes_df['IsReservable'] == True) & (online_classes_df['ReservationButton'] != 0)),
+                                       'correct_IsEnabled': online_only(online_classes_df['IsEnabled'] == True)},
+                                      index=index)
     
     dtypes=(bool,bool,np.int64,bool,bool,bool,bool,bool)
-    for dtype, col in zip(dtypes,candidate_pairs_df.iteritems()):
-        colname, colval = col
+    for dtype, colname in zip(dtypes,candidate_pairs_df.columns):
         candidate_pairs_df[colname] = candidate_pairs_df[colname].astype(dtype)
-        
-    return classes_df, online_classes_df, candidate_pairs_df
+
+    return candidate_pairs_df
+
+def index_matches(classes_df: DataFrame,
+                  online_classes_df: DataFrame) -> Tuple[DataFrame,DataFrame]:
+    '''
+    same basic_matches_df and exact_matches_df as form_candidate_pairs followed by extract_matches, but only
+    the pairs sharing DayOfWeek and one of StartTime, Id, Name are compared; they are found by probing hash
+    indexes on (DayOfWeek, StartTime), Id and (DayOfWeek, Name) of online_classes_df
+    '''
+    online_dow = online_classes_df['DayOfWeek'].to_numpy()
+
+    def build_index(keys):
+        index = dict()
+        for pos, key in enumerate(keys):
+            index.setdefault(key,[]).append(pos)
+        return index
+
+    by_time = build_index(zip(online_dow,online_classes_df['StartTime'].to_numpy()))
+    by_id = build_index(online_classes_df['Id'].to_numpy())
+    by_name = build_index(zip(online_dow,online_classes_df['Name'].to_numpy()))
+
+    own_pos = []
+    online_pos = []
+    own_rows = zip(classes_df['DayOfWeek'].to_numpy(),
+                   classes_df['StartTime'].to_numpy(),
+                   classes_df['Id'].to_numpy(),
+                   classes_df['Name'].to_numpy())
+    for i, (dow, start_time, id, name) in enumerate(own_rows):
+        matches = set(by_time.get((dow,start_time),[]))
+        matches.update(by_name.get((dow,name),[]))
+        matches.update(pos for pos in by_id.get(id,[]) if online_dow[pos] == dow)
+
+        matches = sorted(matches) # keep the order of online_classes_df
+        own_pos += [i]*len(matches)
+        online_pos += matches
+
+    candidate_pairs_df = pair_flags(classes_df,
+                                    online_classes_df,
+                                    np.array(own_pos,dtype=np.int64),
+                                    np.array(online_pos,dtype=np.int64))
+
+    return extract_matches(classes_df, online_classes_df, candidate_pairs_df)
 
 
 
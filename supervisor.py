@@ -0,0 +1,312 @@
+'''
+supervisor of booker worker processes for hundreds of accounts
+
+accounts are sharded over worker processes (pinned to cores), each running a multibooker for its shard;
+the supervisor synchronizes the server clock and measures the round trip once per booking window and sends
+every worker the same fire instant (time lag and lead), then gathers their outcomes into one report
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Union
+
+from booker import add_booker_arguments, booker_kwargs, check_booker_arguments, load_accounts, main, multibooker, print_settings
+from platinium import AsyncClient
+from timing_tools import ClockOffsetEstimator, DeadlineScheduler, LatencyCompensator, next_window
+
+
+def shard_accounts(accounts: List[Tuple[str,str,str]],
+                   n_workers: int) -> List[List[Tuple[str,str,str]]]:
+    '''
+    accounts dealt round robin into at most n_workers non-empty shards
+    '''
+    n = max(1, min(n_workers, len(accounts)))
+    return [accounts[i::n] for i in range(n)]
+
+def merge_classes(reservefiles: List[str]) -> List[List]:
+    '''
+    classes of several reservations files by weekday (reservations.json order), as used by next_window
+    '''
+    classes = None
+    for reservefile in reservefiles:
+        with open(reservefile,'r') as f:
+            days = [val for key,val in json.load(f).items()]
+        classes = days if classes is None else [c + d for c, d in zip(classes, days)]
+    return classes
+
+
+class shardbooker(multibooker):
+    '''
+    multibooker of a worker process; the fire instant of a window comes from the supervisor and the results
+    go back to it through conn
+    '''
+
+    def __init__(self,
+                 accounts: List[Tuple[str,str,str]],
+                 conn: Connection,
+                 **kwargs):
+        super().__init__(accounts, **kwargs)
+        self.conn = conn
+
+    async def synchronize(self,
+                          t_window: datetime) -> timedelta:
+        # fire messages of windows without classes of this shard are never sent; older ones are stale
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self.conn.recv)
+            if message[0] == 'fire' and message[1] == t_window:
+                break
+        _, _, dt, lead = message
+        for b in self.bookers:
+            b.dt = dt
+        return lead
+
+    def report(self,
+               t_window: datetime,
+               active: List,
+               results: List[List]) -> None:
+        super().report(t_window, active, results)
+        self.conn.send(('results', t_window, {'t_fired': self.t_fired,
+                                              'fire_error': self.fire_error,
+                                              'accounts': [(b.name, res) for b, res in zip(active, results)]}))
+
+def run_worker(accounts: List[Tuple[str,str,str]],
+               kwargs: Dict,
+               conn: Connection,
+               cpu: int = None,
+               log_file: str = '') -> None:
+    '''
+    worker process: a shardbooker of accounts pinned to cpu (if supported), printing to log_file (if given)
+    '''
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+    if log_file:
+        sys.stdout = open(log_file, 'a', buffering=1)
+    asyncio.run(main(shardbooker(accounts, conn, **kwargs)))
+
+
+def summarize(values: List[float]) -> Union[Tuple[float,float,float,float],None]:
+    '''
+    min, median, 90th percentile and max of values; None if empty
+    '''
+    if not values:
+        return None
+    values = sorted(values)
+    return values[0], statistics.median(values), values[int(0.9*(len(values)-1))], values[-1]
+
+def aggregate_results(reports: List[Dict]) -> Dict:
+    '''
+    totals and timing (sec) of the worker reports of a window
+    '''
+    results = [(name, res) for report in reports for name, res in report['accounts']]
+    outcomes = [r for name, res in results for r in res]
+    fired = [report['t_fired'] for report in reports]
+
+    return {'workers': len(reports),
+            'accounts': len(results),
+            'reservations': len(outcomes),
+            'reserved': sum(r['success'] for r in outcomes),
+            'tries': sum(r['tries'] for r in outcomes),
+            'fire_spread': max(fired) - min(fired) if fired else None,
+            'fire_error': max((report['fire_error'] for report in reports), default=None),
+            'latency': summarize([r['latency'] for r in outcomes if r['success']]),
+            'landing': summarize([r['landing'] for r in outcomes if r['landing'] is not None]),
+            'failed': [(name, r['cls'], [key for key, flag in r['err_flags'].items() if flag])
+                       for name, res in results for r in res if not r['success']]}
+
+
+class supervisor:
+    '''
+    worker processes booking the accounts of their shards; see the module docstring
+    '''
+
+    def __init__(self,
+                 accounts: List[Tuple[str,str,str]],
+                 n_workers: int = None,
+                 pin: bool = True,
+                 log_dir: str = '',
+                 result_timeout: float = 300.,
+                 **kwargs):
+
+        self.shards = shard_accounts(accounts, n_workers or os.cpu_count() or 1)
+        self.shard_classes = [merge_classes([reservefile for name, authfile, reservefile in shard]) for shard in self.shards]
+        self.classes = merge_classes([reservefile for name, authfile, reservefile in accounts])
+        self.pin = pin
+        self.log_dir = log_dir
+        self.result_timeout = result_timeout
+        self.kwargs = kwargs
+
+        self.dt = kwargs.get('dt', timedelta(0))
+        self.clock_sync = kwargs.get('clock_sync', False)
+        self.rtt_compensation = kwargs.get('rtt_compensation', False)
+        self.sync_lead = timedelta(seconds=kwargs.get('sync_lead', 60))
+        self.clock_estimator = ClockOffsetEstimator()
+        self.compensator = LatencyCompensator(margin=kwargs.get('margin', 0.005))
+        self.scheduler = DeadlineScheduler(spin=0.)
+
+        self.client = None
+        self.workers = [] # (process, connection)
+
+    def get_current_time(self):
+        return datetime.now() + self.dt
+
+    def start_workers(self) -> None:
+
+        ctx = multiprocessing.get_context('spawn')
+        # cores this process may run on, one worker per core in turn
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        # workers synchronize through the supervisor only
+        kwargs = dict(self.kwargs, clock_sync=False, dt=self.dt)
+        for i, shard in enumerate(self.shards):
+            conn, child_conn = ctx.Pipe()
+            cpu = cpus[i % len(cpus)] if self.pin else None
+            log_file = os.path.join(self.log_dir, f'worker{i}.log') if self.log_dir else ''
+            process = ctx.Process(target=run_worker,
+                                  args=(shard, kwargs, child_conn, cpu, log_file),
+                                  name=f'booker-worker{i}',
+                                  daemon=True)
+            process.start()
+            self.workers += [(process, conn)]
+            print(f"worker {i} (pid {process.pid}; cpu {cpu}): {len(shard)} accounts")
+
+    def stop_workers(self) -> None:
+        for process, conn in self.workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.workers = []
+
+    async def sync_clock(self):
+        estimate = await self.clock_estimator.estimate(self.client.probe_date)
+        if estimate is None:
+            print(f'{self.get_current_time()}: clock sync failed; keeping time delta = {self.dt}')
+            return
+        offset, uncertainty, rtt = estimate
+        self.dt = timedelta(seconds=offset)
+        print(f'{self.get_current_time()}: server clock offset = {1000*offset:.1f} ms +/- {1000*uncertainty:.1f} ms (rtt = {1000*rtt:.1f} ms)')
+
+    async def collect(self,
+                      workers: List[int],
+                      t_window: datetime) -> List[Dict]:
+        '''
+        reports of workers about t_window; workers which die or do not report within result_timeout are skipped
+        '''
+        loop = asyncio.get_running_loop()
+
+        def receive(i):
+            process, conn = self.workers[i]
+            t_stop = time.monotonic() + self.result_timeout
+            while time.monotonic() < t_stop and process.is_alive():
+                if conn.poll(1.):
+                    message = conn.recv()
+                    if message[0] == 'results' and message[1] == t_window:
+                        return message[2]
+            print(f'{self.get_current_time()}: no report of worker {i} (alive = {process.is_alive()})')
+            return None
+
+        reports = await asyncio.gather(*[loop.run_in_executor(None, receive, i) for i in workers])
+        return [report for report in reports if report is not None]
+
+    async def supervise(self):
+
+        self.client = AsyncClient(username='', password='', pool_size=2) # probes only, never logs in
+        try:
+            if self.clock_sync:
+                await self.sync_clock()
+            self.start_workers()
+            await self.supervise_loop()
+        finally:
+            await self.client.close()
+            self.stop_workers()
+
+    async def supervise_loop(self):
+        t_last = self.get_current_time()
+
+        while True:
+            t_window = next_window(max(self.get_current_time(), t_last), self.classes)
+            if t_window is None:
+                print(f'{self.get_current_time()}: no classes to reserve')
+                return
+            active = [i for i, classes in enumerate(self.shard_classes) if classes[t_window.weekday()]]
+            print(f'{self.get_current_time()}: next booking window at {t_window} ({len(active)} workers)')
+
+            t_sync = t_window - self.sync_lead
+            if self.get_current_time() < t_sync:
+                await self.scheduler.sleep_until(self.get_current_time, t_sync, record=False)
+            if self.clock_sync:
+                await self.sync_clock()
+            lead = timedelta(0)
+            if self.rtt_compensation:
+                rtt = await self.compensator.measure(self.client.probe_date)
+                lead = self.compensator.lead()
+                print(f'{self.get_current_time()}: rtt = {1000*(rtt or 0.):.1f} ms; requests are sent {1000*lead.total_seconds():.1f} ms ahead of the opening')
+
+            # the same time lag and lead put every worker's fire instant at the same local wall time
+            for i in list(active):
+                try:
+                    self.workers[i][1].send(('fire', t_window, self.dt, lead))
+                except (BrokenPipeError, ConnectionResetError):
+                    print(f'{self.get_current_time()}: worker {i} is gone')
+                    active.remove(i)
+            print(f'{self.get_current_time()}: fire instant {t_window - lead} (server time) sent to {len(active)} workers')
+
+            reports = await self.collect(active, t_window)
+            self.print_report(t_window, aggregate_results(reports))
+            t_last = t_window
+
+    def print_report(self,
+                     t_window: datetime,
+                     agg: Dict) -> None:
+
+        def ms(stats):
+            return 'n/a' if stats is None else '/'.join(f'{1000*v:.1f}' for v in stats)
+
+        print("="*100)
+        print(f"{self.get_current_time()}: booking window {t_window}: reserved {agg['reserved']}/{agg['reservations']} classes of {agg['accounts']} accounts in {agg['workers']} workers ({agg['tries']} tries)")
+        if agg['fire_spread'] is not None:
+            print(f"    fire instants spread over {1000*agg['fire_spread']:.2f} ms across workers (max fire time error = {1e6*agg['fire_error']:.0f} us)")
+        print(f"    latency min/median/p90/max = {ms(agg['latency'])} ms")
+        print(f"    landing min/median/p90/max = {ms(agg['landing'])} ms")
+        for name, cls, reasons in agg['failed']:
+            print(f"    {name}: failed reservation {cls['class_name']} {cls['class_time']}. Reasons: {'; '.join(reasons)}")
+        print("="*100)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--accounts', type=str, default='accounts', help='directory of account subdirectories with auth.json and reservations.json or a json manifest of {"name", "authfile", "reservefile"}')
+    parser.add_argument('--workers', type=int, default=0, help='number of worker processes (0 = one per core)')
+    parser.add_argument('--no_pin', const=True, action='store_const', default=False, help='do not pin worker processes to cores')
+    parser.add_argument('--log_dir', type=str, default='', help='directory of worker logs (empty string = standard output)')
+    add_booker_arguments(parser)
+
+    args = parser.parse_args()
+    check_booker_arguments(parser, args)
+
+    accounts = load_accounts(args.accounts)
+    kwargs = booker_kwargs(args)
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+
+    s = supervisor(accounts,
+                   n_workers=args.workers,
+                   pin=not args.no_pin,
+                   log_dir=args.log_dir,
+                   **kwargs)
+
+    print("="*100)
+    print(f"accounts: {len(accounts)} (from {args.accounts}) in {len(s.shards)} workers (pinned = {not args.no_pin})")
+    print(f"worker logs: {args.log_dir or 'standard output'}")
+    print_settings(kwargs)
+    print("="*100)
+
+    asyncio.run(s.supervise())
@@ -0,0 +1,268 @@
+import subprocess
+import sys
+
+# startup
+
+def test_booker_starts_without_pandas():
+    code = "import sys, booker; print(sorted(m for m in ('pandas','numpy','requests') if m in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == '[]'
+
+# reservation outcomes
+
+def test_classify_reservation():
+    import asyncio
+    from booker import booker
+    from platinium import APIException, APIRequestException
+
+    assert booker.classify_reservation({'Status': 1}, None) == 'success'
+    assert booker.classify_reservation({'Status': 0}, None) == 'retry'
+    assert booker.classify_reservation(None, APIException(None, 503, '')) == 'retry'
+    assert booker.classify_reservation(None, APIException(None, 404, '')) == 'terminal'
+    assert booker.classify_reservation(None, APIException(None, 503, '{"Message": "An error has occurred."}')) == 'retry'
+    assert booker.classify_reservation(None, APIException(None, 502, '["Bad Gateway"]')) == 'retry'
+    assert booker.classify_reservation(None, APIException(None, 400, '{"code": 7, "msg": "full"}')) == 'terminal'
+    assert booker.classify_reservation(None, APIRequestException('Invalid Response')) == 'retry'
+    assert booker.classify_reservation(None, asyncio.TimeoutError()) == 'retry'
+    assert booker.classify_reservation(None, KeyError('Status')) == 'terminal'
+
+# failure diagnosis
+
+def failed_result(class_id, class_time='09:00'):
+    from datetime import datetime
+    h,m = class_time.split(':')
+    return {'cls': {'location_id': 6, 'class_name': 'BODY SHAPE', 'class_id': class_id, 'class_time': class_time},
+            'date': datetime(2022,5,11,int(h),int(m)),
+            'success': False,
+            'tries': 5,
+            'err_flags': {'wrong_class_id': False, 'wrong_class_name': False, 'wrong_location_id': False,
+                          'wrong_class_time': False, 'is_cancelled': False, 'not_reservable': False, 'is_disabled': False}}
+
+def online_class(Id, StartTime='2022-05-11T09:00:00', IsReservable=True):
+    from platinium import ClassRecord
+    return ClassRecord(StartTime, 'BODY SHAPE', Id, 6, 3, False, IsReservable, True, False, 1)
+
+def test_diagnose_failures_from_snapshot():
+    import asyncio
+    import time
+    from booker import booker
+
+    class MockCompareClasses:
+        t_fetched = time.time()
+        def online_class_records(self):
+            return [online_class(8235, IsReservable=False), online_class(8236, '2022-05-11T10:00:00')]
+
+    class MockClient:
+        async def get_class_records(self, **kwargs):
+            raise AssertionError('the snapshot is fresh')
+
+    b = booker('auth.json', 'reservations.json', snapshot_ttl=60.)
+    b.cc, b.client = MockCompareClasses(), MockClient()
+    results = [failed_result(8235), failed_result(8236), failed_result(1)]
+    asyncio.run(b.diagnose_failures(results))
+
+    assert [key for key, flag in results[0]['err_flags'].items() if flag] == ['not_reservable']
+    assert [key for key, flag in results[1]['err_flags'].items() if flag] == ['wrong_class_time']
+    assert [key for key, flag in results[2]['err_flags'].items() if flag] == ['wrong_class_id']
+
+def test_diagnose_failures_refetches_shared_snapshot():
+    import asyncio
+    import time
+    from booker import booker
+    from platinium import ScheduleService
+
+    class MockCompareClasses:
+        t_fetched = time.time()
+        def online_class_records(self):
+            raise AssertionError('the snapshot may hold the per-user fields of another account')
+
+    calls = []
+    class MockClient:
+        async def get_class_records(self, location_id, start_date, use_cache):
+            calls.append(use_cache)
+            return [online_class(8235, IsReservable=False)]
+
+    b = booker('auth.json', 'reservations.json', snapshot_ttl=60.)
+    b.cc, b.client, b.schedule_service = MockCompareClasses(), MockClient(), ScheduleService()
+    results = [failed_result(8235)]
+    asyncio.run(b.diagnose_failures(results))
+
+    assert calls == [False]
+    assert [key for key, flag in results[0]['err_flags'].items() if flag] == ['not_reservable']
+
+def test_diagnose_reservation_wrong_location_id():
+    from platinium import ClassRecord
+    from booker import booker
+
+    res = failed_result(8235)
+    other_location = ClassRecord('2022-05-11T09:00:00', 'BODY SHAPE', 8235, 7, 3, False, True, True, False, 1)
+    booker.diagnose_reservation(res, [other_location])
+    assert [key for key, flag in res['err_flags'].items() if flag] == ['wrong_location_id']
+
+def test_diagnose_failures_refetches_stale_snapshot_once_per_day():
+    import asyncio
+    import time
+    from booker import booker
+
+    class MockCompareClasses:
+        t_fetched = time.time() - 120.
+        def online_class_records(self):
+            raise AssertionError('the snapshot is stale')
+
+    calls = []
+    class MockClient:
+        async def get_class_records(self, location_id, start_date, use_cache):
+            calls.append((location_id, start_date, use_cache))
+            return [online_class(8235)]
+
+    b = booker('auth.json', 'reservations.json', snapshot_ttl=60.)
+    b.cc, b.client = MockCompareClasses(), MockClient()
+    results = [failed_result(8235), failed_result(8235, '18:00')]
+    asyncio.run(b.diagnose_failures(results))
+
+    assert calls == [(6, '2022-05-11T00:00:00', False)]
+    assert not any(results[0]['err_flags'].values())
+    assert [key for key, flag in results[1]['err_flags'].items() if flag] == ['wrong_class_time']
+
+def test_compare_classes_failure_does_not_stop_reservations(capsys):
+    import asyncio
+    from datetime import datetime
+    from booker import booker
+    from platinium.base_client import BaseClient
+
+    class MockClient(BaseClient):
+        async def get_classes(self, location_id, **kwargs):
+            if location_id == 6:
+                raise RuntimeError('503')
+            return []
+
+    b = booker('auth.json', 'reservations.json')
+    b.load_classes(b.reservefile)
+    b.cc, b.client = None, MockClient('user', 'pass')
+    asyncio.run(b.compare_classes(datetime(2022,5,2)))
+
+    assert b.class_snapshot() is None
+    assert 'comparing classes failed' in capsys.readouterr().out
+
+def test_compare_classes_snapshot_is_as_old_as_cached_classes(mocker):
+    import asyncio
+    import time
+    from datetime import datetime
+    from booker import booker
+    from platinium import AsyncClient, ScheduleCache
+
+    class StubClient(AsyncClient):
+        async def _post(self, uri, **kwargs):
+            return []
+
+    b = booker('auth.json', 'reservations.json', backend='records', snapshot_ttl=60.)
+    b.load_classes(b.reservefile)
+    b.cc, b.client = None, StubClient('user', 'pass', schedule_cache=ScheduleCache(path=None, ttl=1e12))
+    b.client._set_login({'access_token': 'token', 'session': {'UserId': 1}})
+
+    mocker.patch('platinium.schedule_cache.time.time', return_value=1000.) # classes cached long ago
+    asyncio.run(b.compare_classes(datetime(2022,5,2)))
+    mocker.stopall()
+    asyncio.run(b.compare_classes(datetime(2022,5,2))) # served by the cache
+    assert b.cc.t_fetched == 1000.
+    assert b.class_snapshot() is None
+
+    b.client.schedule_cache = ScheduleCache(path=None)
+    asyncio.run(b.compare_classes(datetime(2022,5,2)))
+    assert time.time() - b.cc.t_fetched < 5.
+    assert b.class_snapshot() is not None
+
+def test_main_closes_client_when_startup_fails(mocker):
+    import asyncio
+    import pytest
+    import booker as booker_module
+    from platinium import AsyncClient
+
+    sessions = []
+    class FailingClient(AsyncClient):
+        async def restore_or_login(self):
+            sessions.append(self._get_session())
+            raise RuntimeError('login failed')
+
+    mocker.patch('booker.AsyncClient', FailingClient)
+    with pytest.raises(RuntimeError, match='login failed'):
+        asyncio.run(booker_module.main(booker_module.booker('auth.json', 'reservations.json')))
+    assert sessions[0].closed
+
+# multiple accounts
+
+def test_load_accounts_from_directory_and_manifest(tmp_path):
+    import json
+    import pytest
+    from booker import load_accounts
+
+    for name in ['bob','alice']:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'auth.json').write_text('{}')
+        (tmp_path / name / 'reservations.json').write_text('{}')
+    (tmp_path / 'notes').mkdir() # no account files
+    assert load_accounts(str(tmp_path)) == [('alice', str(tmp_path/'alice'/'auth.json'), str(tmp_path/'alice'/'reservations.json')),
+                                            ('bob', str(tmp_path/'bob'/'auth.json'), str(tmp_path/'bob'/'reservations.json'))]
+
+    manifest = tmp_path / 'accounts.json'
+    manifest.write_text(json.dumps([{'name': 'carol', 'authfile': 'a.json', 'reservefile': 'r.json'},
+                                    {'authfile': 'b.json', 'reservefile': 'r.json'}]))
+    assert load_accounts(str(manifest)) == [('carol', str(tmp_path/'a.json'), str(tmp_path/'r.json')),
+                                            ('account1', str(tmp_path/'b.json'), str(tmp_path/'r.json'))]
+
+    manifest.write_text(json.dumps([{'name': 'carol', 'authfile': 'a.json', 'reservefile': 'r.json'}]*2))
+    with pytest.raises(ValueError, match='duplicate account name'):
+        load_accounts(str(manifest))
+    with pytest.raises(ValueError, match='no accounts found'):
+        load_accounts(str(tmp_path / 'notes'))
+
+def test_multibooker_fires_all_accounts_at_once():
+    import asyncio
+    from datetime import datetime
+    from booker import multibooker
+    from platinium.base_client import BaseClient
+
+    sent = []
+    class MockClient(BaseClient):
+        def __init__(self, user_id):
+            super().__init__('user', 'pass')
+            self._set_login({'access_token': str(user_id), 'session': {'UserId': user_id}})
+        async def send(self, request):
+            sent.append((request.token, request.body))
+            return {'Status': 1}
+
+    accounts = [('alice', 'auth.json', 'reservations.json'), ('bob', 'auth.json', 'reservations.json')]
+    mb = multibooker(accounts, concurrent=True)
+    t_window = datetime(2022,5,2) # MON
+    for user_id, b in enumerate(mb.bookers):
+        b.load_classes(b.reservefile)
+        b.client = MockClient(user_id)
+    windows = [b.plan.window(t_window) for b in mb.bookers]
+
+    async def fire():
+        return await asyncio.gather(*[b.reserve_day(w) for b, w in zip(mb.bookers, windows)])
+    results = asyncio.run(fire())
+    n = len(windows[0])
+    assert n > 0
+    assert [len(res) for res in results] == [n, n]
+    assert all(r['success'] for res in results for r in res)
+    assert sorted(token for token, body in sent) == ['Bearer 0']*n + ['Bearer 1']*n
+    mb.print_summary(mb.bookers, results)
+
+def test_multibooker_logins_freeze_around_every_account_window():
+    import asyncio
+    from booker import multibooker
+
+    accounts = [('alice', 'auth.json', 'reservations.json'), ('bob', 'auth.json', 'reservations.json')]
+    mb = multibooker(accounts)
+    mb.bookers[0].classes = [[{'class_id': 1}],[],[],[],[],[],[]]
+    mb.bookers[1].classes = [[],[],[{'class_id': 2}],[],[],[],[]]
+
+    windows = []
+    async def login_loop(classes=None):
+        windows.append(classes)
+    for b in mb.bookers:
+        b.login_loop = login_loop
+    asyncio.run(mb.login_loop())
+
+    assert windows == [[[{'class_id': 1}],[],[{'class_id': 2}],[],[],[],[]]]*2
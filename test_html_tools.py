@@ -0,0 +1,116 @@
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import html_tools
+from test_mock import get_classes_output_mock
+
+# location tables
+
+def schedule_df():
+    # DayOfWeek 1 = MON, 3 = WED
+    return pd.DataFrame([{'StartTime': '2022-03-14T09:00:00', 'Name': 'BODY <SHAPE> & "MORE"', 'Id': 1, 'LocationId': 6, 'DayOfWeek': 1},
+                         {'StartTime': '2022-03-16T10:00:00', 'Name': 'YOGA', 'Id': 3, 'LocationId': 6, 'DayOfWeek': 3},
+                         {'StartTime': '2022-03-14T09:00:00', 'Name': 'ZUMBA', 'Id': 2, 'LocationId': 6, 'DayOfWeek': 1}])
+
+def test_render_tab():
+    cell1 = ('<div class="activity-cell" data-location-id=6 data-day="MON" data-class-name="BODY &lt;SHAPE&gt; &amp; &quot;MORE&quot;" '
+             'data-class-id=1 data-class-time="09:00"><h6>BODY &lt;SHAPE&gt; &amp; &quot;MORE&quot;</h6><p>id = 1</p></div>')
+    cell2 = ('<div class="activity-cell" data-location-id=6 data-day="MON" data-class-name="ZUMBA" '
+             'data-class-id=2 data-class-time="09:00"><h6>ZUMBA</h6><p>id = 2</p></div>')
+    cell3 = ('<div class="activity-cell" data-location-id=6 data-day="WED" data-class-name="YOGA" '
+             'data-class-id=3 data-class-time="10:00"><h6>YOGA</h6><p>id = 3</p></div>')
+    empty = '<td></td>'
+
+    expected = ('<table id="loc6"><thead><tr><th class="hour"></th>'
+                '<th>Poniedziałek</th><th>Wtorek</th><th>Środa</th><th>Czwartek</th><th>Piątek</th><th>Sobota</th><th>Niedziela</th>'
+                '</tr></thead><tbody>'
+                # two MON classes at 09:00 take two rows of the same (even) hour
+                f'<tr class="even"><td class="hour">09:00</td><td class="cell">{cell1}</td>{empty*6}</tr>'
+                f'<tr class="even"><td class="hour"></td><td class="cell">{cell2}</td>{empty*6}</tr>'
+                f'<tr class="odd"><td class="hour">10:00</td>{empty*2}<td class="cell">{cell3}</td>{empty*4}</tr>'
+                '</tbody></table>')
+
+    assert html_tools.render_tab(schedule_df(), 6) == expected
+
+def test_render_tab_without_classes():
+    df = pd.DataFrame(columns=['StartTime', 'Name', 'Id', 'LocationId', 'DayOfWeek'])
+    tab = html_tools.render_tab(df, 6)
+    assert tab.startswith('<table id="loc6"><thead>')
+    assert tab.endswith('</tr></thead><tbody></tbody></table>')
+
+# reservations tool
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reservations_tool.template')
+
+class MockClient:
+    def __init__(self):
+        self.names = {6: 'BODY SHAPE', 7: 'YOGA'}
+        self.failing = set()
+    def get_locations(self):
+        return [{'Id': 6, 'Name': 'Club 6'}, {'Id': 7, 'Name': 'Club 7'}]
+    def get_classes(self, location_id, start_date, days):
+        if location_id in self.failing:
+            raise RuntimeError('503')
+        return [dict(cls, LocationId=location_id, Name=self.names[location_id]) for cls in get_classes_output_mock]
+
+def generate_html(client, tmp_path, capsys, lazy=False):
+    html_tools.generate_html(client,
+                             template_file=TEMPLATE,
+                             html_file=str(tmp_path/'tool.html'),
+                             start_date=datetime(2022,3,13),
+                             tab_cache_file=str(tmp_path/'tabs.json'),
+                             lazy=lazy)
+    return capsys.readouterr().out
+
+def test_generate_html_reuses_unchanged_tabs(tmp_path, capsys):
+    client = MockClient()
+    assert '0 of 2 location tabs reused' in generate_html(client, tmp_path, capsys)
+    html = (tmp_path/'tool.html').read_text()
+    assert '<table id="loc6">' in html and '<table id="loc7">' in html
+
+    assert '2 of 2 location tabs reused' in generate_html(client, tmp_path, capsys)
+    assert (tmp_path/'tool.html').read_text() == html
+
+    client.names[7] = 'PILATES'
+    assert '1 of 2 location tabs reused' in generate_html(client, tmp_path, capsys)
+    assert 'PILATES' in (tmp_path/'tool.html').read_text()
+
+def test_generate_html_never_reuses_tabs_of_the_other_mode(tmp_path, capsys):
+    client = MockClient()
+    generate_html(client, tmp_path, capsys)
+    assert '0 of 2 location tabs reused' in generate_html(client, tmp_path, capsys, lazy=True)
+    assert '<table id="loc6">' not in (tmp_path/'tool.html').read_text()
+    with open(tmp_path/'tabs.json') as f:
+        assert all(entry['lazy'] for entry in json.load(f).values())
+    assert '0 of 2 location tabs reused' in generate_html(client, tmp_path, capsys)
+
+def test_generate_html_failure_leaves_previous_tool(tmp_path, capsys):
+    client = MockClient()
+    generate_html(client, tmp_path, capsys)
+    html = (tmp_path/'tool.html').read_text()
+
+    client.failing.add(7)
+    with pytest.raises(RuntimeError):
+        generate_html(client, tmp_path, capsys)
+    assert (tmp_path/'tool.html').read_text() == html
+    assert not os.path.exists(tmp_path/'tool.html.tmp')
+
+def test_generate_html_lazy_inlines_escaped_schedules(tmp_path, capsys):
+    client = MockClient()
+    client.names[7] = 'YOGA </script><script>alert(1)</script>'
+    generate_html(client, tmp_path, capsys, lazy=True)
+    html = (tmp_path/'tool.html').read_text()
+
+    assert '__SCHEDULES__' not in html and '__CONTAINER__' not in html
+    data = html.split('const schedules = ')[1].split(';\n')[0]
+    assert '</' not in data
+    schedules = json.loads(data)
+    assert sorted(schedules) == ['loc6', 'loc7']
+    # [class_time, weekday, class_name, class_id] sorted by class_time
+    assert schedules['loc7'][0] == ['08:00', 'THU', 'YOGA </script><script>alert(1)</script>', 7193]
+    assert [cls[0] for cls in schedules['loc6']] == sorted(cls[0] for cls in schedules['loc6'])
+    assert len(schedules['loc6']) == len(get_classes_output_mock)
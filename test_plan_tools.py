@@ -0,0 +1,44 @@
+import json
+
+from platinium.base_client import BaseClient
+import plan_tools
+
+classes_dict = {'MON': [{'location_id': 4, 'class_name': 'KORT 2', 'class_id': 689, 'class_time': '06:30'}],
+                'TUE': [],
+                'WED': [{'location_id': 6, 'class_name': 'BODY SHAPE', 'class_id': 8235, 'class_time': '09:00'},
+                        {'location_id': 6, 'class_name': 'ZUMBA', 'class_id': 8236, 'class_time': '18:15'}],
+                'THU': [], 'FRI': [], 'SAT': [], 'SUN': []}
+
+def logged_client(token):
+    client = BaseClient('user','pass')
+    client._set_login({'access_token': token, 'session': {'UserId': 123456}})
+    return client
+
+# reservation plan
+
+def test_window_plan_dates():
+    plan = plan_tools.ReservationPlan(classes_dict)
+    t_window = plan_tools.datetime(year=2022,month=5,day=4) # WED
+    window = plan.window(t_window)
+    assert len(window) == 2
+    assert [r.date for r in window.reservations] == [plan_tools.datetime(2022,5,11,9,0), plan_tools.datetime(2022,5,11,18,15)]
+    assert window.reservations[0].date_iso == '2022-05-11T09:00:00'
+    assert window.reservations[1].cls is classes_dict['WED'][1]
+
+def test_window_plan_prepares_requests_per_token():
+    window = plan_tools.ReservationPlan(classes_dict).window(plan_tools.datetime(year=2022,month=5,day=2)) # MON
+    client = logged_client('token1')
+
+    requests = window.prepare(client)
+    assert len(requests) == 1
+    assert requests[0].url.endswith('/pl/classes/add-reservation')
+    assert requests[0].headers['authorization'] == 'Bearer token1'
+    assert json.loads(requests[0].body) == {'UserId': 123456, 'Date': '2022-05-09T06:30:00', 'ClassScheduleId': 689}
+    assert isinstance(requests[0].body, bytes)
+    assert window.prepare(client) is requests
+
+    client._set_login({'access_token': 'token2', 'session': {'UserId': 123456}})
+    renewed = window.prepare(client)
+    assert renewed is not requests
+    assert renewed[0].token == 'Bearer token2'
+    assert renewed[0].body == requests[0].body
@@ -0,0 +1,300 @@
+import os
+import pytest
+
+import platinium
+
+# json codecs
+
+def test_codecs_round_trip():
+    from test_mock import get_classes_output_mock
+    for name in platinium.CODECS:
+        codec = platinium.get_codec(name)
+        assert codec.loads(codec.dumps(get_classes_output_mock)) == get_classes_output_mock
+
+def test_unknown_codec():
+    with pytest.raises(ValueError,match='unknown codec'):
+        platinium.get_codec('wrong')
+
+def test_default_codec_falls_back_to_json(mocker):
+    import builtins
+    real_import = builtins.__import__
+    def no_orjson(name, *args, **kwargs):
+        if name == 'orjson':
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+    mocker.patch('builtins.__import__', no_orjson)
+    assert type(platinium.get_codec()) is platinium.JSONCodec
+
+# shared schedule fetches
+
+def test_schedule_service_single_flight():
+    import asyncio
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{'Id': 1}]
+
+    async def run():
+        service = platinium.ScheduleService(ttl=60.)
+        out = await asyncio.gather(*[service.get(3, '2022-03-13T00:00:00', 7, fetch) for i in range(5)])
+        out += [await service.get('3', '2022-03-13T00:00:00', 7, fetch)] # recent
+        await service.get(4, '2022-03-13T00:00:00', 7, fetch) # another club
+        return service, out
+
+    service, out = asyncio.run(run())
+    assert len(calls) == 2
+    assert all(classes is out[0] for classes in out)
+    assert service.stats() == {'fetches': 2, 'hits': 1, 'joined': 4}
+
+def test_schedule_service_errors_are_not_cached():
+    import asyncio
+    results = iter([RuntimeError('server down'), [{'Id': 1}]])
+    async def fetch():
+        await asyncio.sleep(0.01)
+        r = next(results)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    async def run():
+        service = platinium.ScheduleService(ttl=0.)
+        failed = await asyncio.gather(*[service.get(3, 'd', 7, fetch) for i in range(3)], return_exceptions=True)
+        return failed, await service.get(3, 'd', 7, fetch)
+
+    failed, classes = asyncio.run(run())
+    assert all(isinstance(e, RuntimeError) for e in failed)
+    assert classes == [{'Id': 1}]
+
+def test_schedule_service_cancelled_fetch_is_taken_over():
+    import asyncio
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return [{'Id': len(calls)}]
+
+    async def run():
+        service = platinium.ScheduleService()
+        leader = asyncio.create_task(service.get(3, 'd', 7, fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service.get(3, 'd', 7, fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == [{'Id': 2}]
+    assert len(calls) == 2
+
+# session cache
+
+def save_session(path, username):
+    platinium.SessionCache(path).save(username, {'access_token': username, 'session': {'UserId': 1}, 'expires_in': 3600})
+
+def test_session_cache_load_expiry_and_margin(tmp_path, mocker):
+    path = str(tmp_path / 'session_cache.json')
+    cache = platinium.SessionCache(path, default_lifetime=1000, margin=300)
+    assert cache.load('alice') is None
+
+    mocker.patch('platinium.session_cache.time.time', return_value=10000.)
+    assert cache.save('alice', {'access_token': 'token', 'session': {'UserId': 1}}) # default lifetime
+    cache.save('bob', {'access_token': 'token2', 'session': {'UserId': 2}, 'expires_in': 3600})
+    assert cache.load('alice') == {'access_token': 'token', 'session': {'UserId': 1}, 'expires_in': 1000}
+
+    mocker.patch('platinium.session_cache.time.time', return_value=10000. + 650.)
+    assert cache.load('alice')['expires_in'] == 350
+    mocker.patch('platinium.session_cache.time.time', return_value=10000. + 750.) # less than margin left
+    assert cache.load('alice') is None
+    assert cache.load('bob')['access_token'] == 'token2'
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+def test_session_cache_restores_login(tmp_path):
+    from platinium.base_client import BaseClient
+    path = str(tmp_path / 'session_cache.json')
+    save_session(path, 'alice')
+
+    client = BaseClient('alice', 'pass', session_cache=platinium.SessionCache(path))
+    assert client._restore_login()
+    assert client.logged and client.headers['authorization'] == 'Bearer alice'
+    assert client.token_lifetime <= 3600
+    assert not BaseClient('bob', 'pass', session_cache=platinium.SessionCache(path))._restore_login()
+
+def test_session_cache_concurrent_saves(tmp_path):
+    import multiprocessing
+    path = str(tmp_path / 'session_cache.json')
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=save_session, args=(path, f'user{i}')) for i in range(8)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert all(p.exitcode == 0 for p in processes)
+    cache = platinium.SessionCache(path)
+    assert all(cache.load(f'user{i}') is not None for i in range(8))
+
+def test_session_cache_write_failure_never_fails_login(tmp_path):
+    cache = platinium.SessionCache(str(tmp_path / 'missing' / 'session_cache.json'))
+    assert not cache.save('alice', {'access_token': 'token', 'session': {'UserId': 1}})
+
+# schedule cache
+
+def test_schedule_cache_ttl(mocker):
+    cache = platinium.ScheduleCache(path=None, ttl=600.)
+    key = platinium.ScheduleCache.key(1, 3, '2022-03-13T00:00:00', 7)
+    mocker.patch('platinium.schedule_cache.time.time', return_value=1000.)
+    cache.put(key, [{'Id': 1}])
+    mocker.patch('platinium.schedule_cache.time.time', return_value=1599.)
+    assert cache.get(key) == [{'Id': 1}]
+    mocker.patch('platinium.schedule_cache.time.time', return_value=1601.)
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_schedule_cache_lru_eviction(tmp_path):
+    cache = platinium.ScheduleCache(path=str(tmp_path), max_entries=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1] # b is now the least recently used
+    cache.put('c', [3])
+    assert cache.get('b') is None
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+    assert len(os.listdir(tmp_path)) == 2
+
+def test_schedule_cache_disk_round_trip(tmp_path):
+    from test_mock import get_classes_output_mock
+    key = platinium.ScheduleCache.key(1, 3, '2022-03-13T00:00:00', 7)
+    platinium.ScheduleCache(path=str(tmp_path)).put(key, get_classes_output_mock)
+    assert platinium.ScheduleCache(path=str(tmp_path)).get(key) == get_classes_output_mock
+    assert platinium.ScheduleCache(path=str(tmp_path), ttl=0.).get(key) is None # pruned as expired
+    assert os.listdir(tmp_path) == []
+
+def test_schedule_cache_write_failure_keeps_memory_entry(tmp_path, mocker, capsys):
+    cache = platinium.ScheduleCache(path=str(tmp_path))
+    mocker.patch('platinium.schedule_cache.json.dump', side_effect=OSError(28, 'No space left on device'))
+    cache.put('a', [1])
+    assert cache.get('a') == [1]
+    assert os.listdir(tmp_path) == [] # no temporary file left behind
+    assert 'could not store classes' in capsys.readouterr().out
+
+    os.rmdir(tmp_path) # the cache directory is gone
+    mocker.stopall()
+    cache.put('b', [2])
+    assert cache.get('b') == [2]
+
+def test_schedule_cache_concurrent_pruning(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    for i in range(200):
+        (tmp_path / f'{i}.json').write_text('{}')
+    with ThreadPoolExecutor(8) as executor:
+        caches = list(executor.map(lambda i: platinium.ScheduleCache(path=str(tmp_path), max_entries=0), range(8)))
+    assert len(caches) == 8
+    assert os.listdir(tmp_path) == []
+
+def test_get_classes_use_cache_false_bypasses_cache(tmp_path):
+    import asyncio
+    from platinium.async_client import AsyncClient
+
+    calls = []
+    class StubClient(AsyncClient):
+        async def _post(self, uri, **kwargs):
+            calls.append(uri)
+            return [{'Id': len(calls)}]
+
+    async def run():
+        client = StubClient('user', 'pass', schedule_cache=platinium.ScheduleCache(path=str(tmp_path)))
+        client._set_login({'access_token': 'token', 'session': {'UserId': 1}})
+        first = await client.get_classes(3, '2022-03-13T00:00:00', 7)
+        cached = await client.get_classes(3, '2022-03-13T00:00:00', 7)
+        fresh = await client.get_classes(3, '2022-03-13T00:00:00', 7, use_cache=False)
+        refreshed = await client.get_classes(3, '2022-03-13T00:00:00', 7)
+        return first, cached, fresh, refreshed
+
+    first, cached, fresh, refreshed = asyncio.run(run())
+    assert first == cached == [{'Id': 1}]
+    assert fresh == refreshed == [{'Id': 2}] # the bypass still refreshes the cache
+    assert len(calls) == 2
+
+def test_shared_classes_never_enter_the_schedule_cache(tmp_path):
+    import asyncio
+    from platinium.async_client import AsyncClient
+
+    class StubClient(AsyncClient):
+        async def _post(self, uri, **kwargs):
+            user_id = self.api_session_data['UserId']
+            return [{'Id': 1, 'ReservationButton': user_id, 'IsReserved': user_id == 1}]
+
+    async def run():
+        service = platinium.ScheduleService()
+        clients = []
+        for user_id in [1, 2]:
+            client = StubClient('user', 'pass',
+                                schedule_cache=platinium.ScheduleCache(path=str(tmp_path/str(user_id))),
+                                schedule_service=service)
+            client._set_login({'access_token': 'token', 'session': {'UserId': user_id}})
+            clients += [client]
+        shared = [await client.get_classes(3, '2022-03-13T00:00:00', 7) for client in clients]
+        own = await clients[1].get_classes(3, '2022-03-13T00:00:00', 7, use_cache=False)
+        return clients, shared, own
+
+    clients, shared, own = asyncio.run(run())
+    assert shared[0] is shared[1] # fetched by the first account
+    assert own == [{'Id': 1, 'ReservationButton': 2, 'IsReserved': False}]
+    assert clients[0].schedule_cache.get(platinium.ScheduleCache.key(1, 3, '2022-03-13T00:00:00', 7)) is None
+    # only the own view of the second account is cached for it
+    assert clients[1].schedule_cache.get(platinium.ScheduleCache.key(2, 3, '2022-03-13T00:00:00', 7)) == own
+
+# connection warm-up
+
+class ProbeClient(platinium.AsyncClient):
+    def __init__(self, failing=0, **kwargs):
+        super().__init__('user', 'pass', **kwargs)
+        self.probes = 0
+        self.failing = failing # number of first probes which fail
+    async def probe_date(self):
+        self.probes += 1
+        if self.probes <= self.failing:
+            raise platinium.APIRequestException('Invalid Response: no Date header')
+        return 0., 0., 0.
+
+def test_warm_up_probes_at_most_pool_size():
+    import asyncio
+    async def run():
+        client = ProbeClient(pool_size=4)
+        warm = await client.warm_up(10)
+        await client.close()
+        return client.probes, warm
+    assert asyncio.run(run()) == (4, 4)
+
+def test_warm_up_counts_answered_probes():
+    import asyncio
+    async def run():
+        client = ProbeClient(failing=1, pool_size=4)
+        warm = await client.warm_up(3)
+        await client.close()
+        return client.probes, warm
+    assert asyncio.run(run()) == (3, 2)
+
+def test_keep_warm_reports_once(capsys):
+    import asyncio
+    import time
+    async def run():
+        client = ProbeClient(pool_size=2)
+        t_start = time.monotonic()
+        rounds = await client.keep_warm(interval=0.02, duration=0.1)
+        elapsed = time.monotonic() - t_start
+        await client.close()
+        return client.probes, rounds, elapsed
+    probes, rounds, elapsed = asyncio.run(run())
+    assert 2 <= len(rounds) <= 6 and set(rounds) == {2}
+    assert probes == 2*len(rounds)
+    assert elapsed < 0.1 # no round starts after the duration
+    assert capsys.readouterr().out.count('warm connections') == 1
+
+def test_keep_warm_without_time_left_sends_no_probe(capsys):
+    import asyncio
+    async def run():
+        client = ProbeClient(pool_size=2)
+        rounds = await client.keep_warm(interval=0.02, duration=-0.5)
+        await client.close()
+        return client.probes, rounds
+    assert asyncio.run(run()) == (0, [])
+    assert capsys.readouterr().out == ''
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 
 import reserve_tools
@@ -243,10 +244,31 @@ def test_generate_online_classes_df(mocker):
     assert online_classes_df['IsCanceled'].dtype == bool
     assert online_classes_df.shape == (10,10)
     
+def test_agenerate_online_classes_df(mocker):
+    from test_mock import get_classes_output_mock
+    
+    async def mock_get_classes(self,location_id,start_date,days):
+        return get_classes_output_mock
+
+    mocker.patch(
+        'reserve_tools.AsyncClient.get_classes',
+        mock_get_classes
+    )
+
+    client = reserve_tools.AsyncClient(username='aa',password='bb')
+    date = reserve_tools.datetime(year=2022,month=5,day=3,hour=18,minute=35,second=10,microsecond=0)
+    online_classes_df = asyncio.run(reserve_tools.agenerate_online_classes_df(client=client,
+                                                                              location_ids=[3],
+                                                                              date=date,
+                                                                              days_forward=1))
+    assert all (k in online_classes_df.columns for k in reserve_tools.ONLINE_CLASSES_COLUMNS)
+    assert online_classes_df.index.name == reserve_tools.ONLINE_CLASSES_INDEX
+    assert online_classes_df.shape == (10,10)
+    
 def test_generate_online_classes_df_wrong_name_in_cols(mocker):
     from test_mock import get_classes_output_mock
     
-    cols = reserve_tools.ONLINE_CLASSES_COLUMNS
+    cols = reserve_tools.ONLINE_CLASSES_COLUMNS.copy() # do not modify the module default
     cols+=['wrong_column']
     
     def mock_get_classes(self,location_id,start_date,days):
@@ -363,3 +385,139 @@ def test_extract_matches():
     candidate_pairs_df = reserve_tools.pd.DataFrame(candidate_pairs_df_dict_mock)
     
     basic_matches_df, exact_matches_df = reserve_tools.extract_matches(classes_df,online_classes_df,candidate_pairs_df)
+    
+def test_index_matches_same_as_candidate_pairs():
+    
+    from test_mock import classes_transformed_sorted_df_dict_mock, online_classes_transformed_sorted_df_dict_mock
+    classes_df = reserve_tools.pd.DataFrame(classes_transformed_sorted_df_dict_mock)
+    online_classes_df = reserve_tools.pd.DataFrame(online_classes_transformed_sorted_df_dict_mock)
+    for col in ['LocationId','Name','Id','StartTime','DayOfWeek']:
+        classes_df.loc[0,col] = online_classes_df.loc[6,col] # make own class 0 an exact match of online class 6
+    
+    _, _, candidate_pairs_df = reserve_tools.form_candidate_pairs(classes_df, online_classes_df)
+    basic_matches_df, exact_matches_df = reserve_tools.extract_matches(classes_df, online_classes_df, candidate_pairs_df)
+    basic_index_df, exact_index_df = reserve_tools.index_matches(classes_df, online_classes_df)
+    
+    assert exact_matches_df.index.to_list() == [(0,6)]
+    assert basic_index_df.equals(basic_matches_df)
+    assert exact_index_df.equals(exact_matches_df)
+    assert (basic_index_df.dtypes == basic_matches_df.dtypes).all()
+    assert basic_index_df.index.names == basic_matches_df.index.names
+    
+def test_compare_classes_wrong_matcher():
+    with pytest.raises(ValueError,match='unknown matcher'):
+        reserve_tools.CompareClasses(client=None, classes={}, matcher='wrong')
+    with pytest.raises(ValueError,match='unknown backend'):
+        reserve_tools.CompareClasses(client=None, classes={}, backend='wrong')
+
+@pytest.mark.parametrize('matcher', ['pairs','index'])
+def test_records_backend_same_as_pandas(matcher):
+    from test_mock import get_classes_output_mock
+
+    class MockClient:
+        def get_classes(self,location_id,start_date,days):
+            return [cls for cls in get_classes_output_mock if cls['LocationId'] == location_id]
+
+    classes = {'THU': [{'location_id': 3, 'class_name': 'BRZUCHOMANIA', 'class_id': 6911, 'class_time': '18:00'}, # exact match
+                       {'location_id': 3, 'class_name': 'qpaa', 'class_id': 520, 'class_time': '08:00'}],
+               'SAT': [{'location_id': 4, 'class_name': 'KORT 2 - Rezerwacja Squash', 'class_id': 510, 'class_time': '18:30'}],
+               'SUN': [{'location_id': 3, 'class_name': 'TABATA', 'class_id': 1, 'class_time': '18:00'}],
+               'MON': [{'location_id': 3, 'class_name': 'TABATA', 'class_id': 2, 'class_time': '09:00'}]} # no MON classes online
+
+    ccs = dict()
+    for backend in ['pandas','records']:
+        ccs[backend] = reserve_tools.CompareClasses(MockClient(), classes, matcher=matcher, backend=backend)
+        ccs[backend]._set_dates(start_date=reserve_tools.datetime(2022,3,6))
+        ccs[backend]._generate_dfs()
+        ccs[backend]._generate_matches()
+    cc_df, cc_rec = ccs['pandas'], ccs['records']
+
+    assert [cls.own_id for cls in cc_rec.classes] == cc_df.classes_df.index.to_list()
+    assert [cls.online_id for cls in cc_rec.online_classes] == cc_df.online_classes_df.index.to_list()
+    assert [cls.StartTime for cls in cc_rec.online_classes] == cc_df.online_classes_df['StartTime'].to_list()
+
+    for matches, matches_df in [(cc_rec.basic_matches, cc_df.basic_matches_df),
+                                (cc_rec.exact_matches, cc_df.exact_matches_df)]:
+        assert [(p.own_id,p.online_id) for p in matches] == matches_df.index.to_list()
+        for col in matches_df.columns:
+            assert [bool(getattr(p,col)) for p in matches] == matches_df[col].astype(bool).to_list()
+    assert [(p.own_id,p.online_id) for p in cc_rec.exact_matches] == [(0,7)]
+
+def test_generate_online_classes_df_ordered_and_partial(mocker):
+    from test_mock import get_classes_output_mock
+    import time
+    
+    def mock_get_classes(self,location_id,start_date,days):
+        if location_id == 5:
+            raise ConnectionError('no connection')
+        time.sleep(0.01*(4-location_id)) # later locations answer first
+        return [dict(cls,LocationId=location_id) for cls in get_classes_output_mock]
+    
+    def mock_init(self,username,password,auto_log):
+        pass
+
+    mocker.patch(
+        'reserve_tools.Client.get_classes',
+        mock_get_classes
+    )
+    mocker.patch(
+        'reserve_tools.Client.__init__',
+        mock_init
+    )
+
+    client = reserve_tools.Client(username='aa',password='bb',auto_log=True)
+    date = reserve_tools.datetime(year=2022,month=5,day=3,hour=18,minute=35,second=10,microsecond=0)
+    online_classes_df = reserve_tools.generate_online_classes_df(client=client,
+                                                                 location_ids=[1,2,3],
+                                                                 date=date,
+                                                                 days_forward=1)
+    assert online_classes_df['LocationId'].to_list() == [1]*10 + [2]*10 + [3]*10
+    
+    with pytest.raises(RuntimeError,match=r'fetching classes failed for location_ids \[5\]'):
+        reserve_tools.generate_online_classes_df(client=client,
+                                                 location_ids=[1,5,3],
+                                                 date=date,
+                                                 days_forward=1)
+    
+    online_classes_df = reserve_tools.generate_online_classes_df(client=client,
+                                                                 location_ids=[1,5,3],
+                                                                 date=date,
+                                                                 days_forward=1,
+                                                                 allow_partial=True)
+    assert online_classes_df['LocationId'].to_list() == [1]*10 + [3]*10
+
+def test_online_classes_to_df_from_class_records():
+    from test_mock import get_classes_output_mock
+    records = reserve_tools.parse_classes(get_classes_output_mock)
+    assert records[0]['Id'] == get_classes_output_mock[0]['Id']
+    assert records[0].start == reserve_tools.datetime.fromisoformat(get_classes_output_mock[0]['StartTime'])
+    assert not hasattr(records[0], 'Trainers')
+
+    online_classes_df = reserve_tools.online_classes_to_df(records)
+    online_classes_raw_df = reserve_tools.online_classes_to_df(get_classes_output_mock)
+    assert online_classes_df.equals(online_classes_raw_df)
+    assert (online_classes_df.dtypes == online_classes_raw_df.dtypes).all()
+
+def test_online_class_records_same_for_both_backends():
+    from test_mock import get_classes_output_mock
+
+    class MockClient:
+        def get_classes(self,location_id,start_date,days):
+            return [cls for cls in get_classes_output_mock if cls['LocationId'] == location_id]
+
+    classes = {'THU': [{'location_id': 3, 'class_name': 'BRZUCHOMANIA', 'class_id': 6911, 'class_time': '18:00'}],
+               'SAT': [{'location_id': 4, 'class_name': 'KORT 2 - Rezerwacja Squash', 'class_id': 510, 'class_time': '18:30'}]}
+
+    records = dict()
+    for backend in ['pandas','records']:
+        cc = reserve_tools.CompareClasses(MockClient(), classes, backend=backend)
+        assert cc.online_class_records() == []
+        cc._set_dates(start_date=reserve_tools.datetime(2022,3,6))
+        cc._generate_dfs()
+        assert cc.t_fetched is not None
+        records[backend] = sorted(cc.online_class_records(), key=lambda c: (c.StartTime, c.Id))
+
+    expected = sorted(reserve_tools.parse_classes([cls for cls in get_classes_output_mock if cls['LocationId'] in (3,4)]),
+                      key=lambda c: (c.StartTime, c.Id))
+    assert records['records'] == expected
+    assert records['pandas'] == expected
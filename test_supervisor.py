@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+import json
+import multiprocessing
+
+import supervisor
+
+# sharding
+
+def test_shard_accounts_round_robin():
+    accounts = [(f'acc{i}', 'auth.json', 'reservations.json') for i in range(5)]
+    shards = supervisor.shard_accounts(accounts, 2)
+    assert [[name for name, authfile, reservefile in shard] for shard in shards] == [['acc0','acc2','acc4'], ['acc1','acc3']]
+    assert len(supervisor.shard_accounts(accounts, 8)) == 5
+    assert supervisor.shard_accounts(accounts, 0) == [accounts]
+
+def test_merge_classes(tmp_path):
+    days = ['MON','TUE','WED','THU','FRI','SAT','SUN']
+    for i, day in enumerate(['MON','WED']):
+        classes = {d: [] for d in days}
+        classes[day] = [{'class_id': i}]
+        (tmp_path / f'{i}.json').write_text(json.dumps(classes))
+    classes = supervisor.merge_classes([str(tmp_path / '0.json'), str(tmp_path / '1.json')])
+    assert classes == [[{'class_id': 0}], [], [{'class_id': 1}], [], [], [], []]
+
+# worker synchronization
+
+def test_shardbooker_waits_for_the_fire_message_of_its_window():
+    conn, child_conn = multiprocessing.Pipe()
+    sb = supervisor.shardbooker([('alice', 'auth.json', 'reservations.json')], child_conn)
+    t_window = datetime(2022,5,2)
+    conn.send(('fire', t_window - timedelta(days=7), timedelta(seconds=5), timedelta(0))) # stale
+    conn.send(('fire', t_window, timedelta(seconds=1.5), timedelta(milliseconds=3)))
+
+    lead = asyncio.run(asyncio.wait_for(sb.synchronize(t_window), 5))
+    assert lead == timedelta(milliseconds=3)
+    assert sb.bookers[0].dt == timedelta(seconds=1.5)
+
+# report
+
+def test_aggregate_results():
+    def result(success, latency=None, landing=None, tries=1):
+        return {'cls': {'class_name': 'TABATA', 'class_time': '18:00'},
+                'success': success, 'tries': tries, 'latency': latency, 'landing': landing,
+                'err_flags': {'wrong_class_id': False, 'not_reservable': not success}}
+
+    reports = [{'t_fired': 100.0001, 'fire_error': 20e-6,
+                'accounts': [('alice', [result(True, 0.010, 0.002), result(False, tries=5)])]},
+               {'t_fired': 100.0003, 'fire_error': 50e-6,
+                'accounts': [('bob', [result(True, 0.020, 0.004)]), ('carol', [])]}]
+    agg = supervisor.aggregate_results(reports)
+
+    assert (agg['workers'], agg['accounts'], agg['reservations'], agg['reserved'], agg['tries']) == (2, 3, 3, 2, 7)
+    assert abs(agg['fire_spread'] - 0.0002) < 1e-9
+    assert agg['fire_error'] == 50e-6
+    assert agg['latency'] == (0.010, 0.015, 0.010, 0.020)
+    assert agg['failed'] == [('alice', {'class_name': 'TABATA', 'class_time': '18:00'}, ['not_reservable'])]
+    assert supervisor.aggregate_results([])['latency'] is None
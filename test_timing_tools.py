@@ -0,0 +1,216 @@
+import asyncio
+import time
+
+import pytest
+
+import timing_tools
+
+# next booking window
+
+def test_next_window_skips_days_without_classes():
+    classes = [[],[],[{'class_id': 1}],[],[],[],[]] # only WED has classes
+    t_now = timing_tools.datetime(year=2022,month=5,day=2,hour=18,minute=35) # MON
+    t_window = timing_tools.next_window(t_now, classes)
+    assert t_window == timing_tools.datetime(year=2022,month=5,day=4)
+    assert t_window.weekday() == 2
+
+def test_next_window_is_strictly_after_t_now():
+    classes = [[{'class_id': 1}]]*7
+    t_now = timing_tools.datetime(year=2022,month=5,day=2)
+    assert timing_tools.next_window(t_now, classes) == timing_tools.datetime(year=2022,month=5,day=3)
+
+def test_next_window_no_classes():
+    classes = [[]]*7
+    t_now = timing_tools.datetime(year=2022,month=5,day=2)
+    assert timing_tools.next_window(t_now, classes) is None
+
+# deadline scheduler
+
+def test_sleep_until_fires_after_deadline_within_bound():
+    scheduler = timing_tools.DeadlineScheduler(coarse_step=0.05, approach=0.02, spin=0.002)
+    deadline = timing_tools.datetime.now() + timing_tools.timedelta(seconds=0.1)
+    error = asyncio.run(scheduler.sleep_until(timing_tools.datetime.now, deadline))
+    # the final approach runs on the monotonic clock, which may be slewed against the wall clock slightly
+    assert timing_tools.datetime.now() >= deadline - timing_tools.timedelta(milliseconds=1)
+    assert 0 <= error < 0.01
+    assert scheduler.errors == [error]
+
+def test_sleep_until_records_fires_only():
+    scheduler = timing_tools.DeadlineScheduler(approach=0.02, spin=0.002)
+    async def sleeps():
+        now = timing_tools.datetime.now
+        await scheduler.sleep_until(now, now() + timing_tools.timedelta(seconds=0.01), record=False)
+        return await scheduler.sleep_until(now, now() + timing_tools.timedelta(seconds=0.01))
+    error = asyncio.run(sleeps())
+    assert scheduler.errors == [error]
+    assert scheduler.max_error() == error
+
+def test_sleep_until_past_deadline_returns_immediately():
+    scheduler = timing_tools.DeadlineScheduler()
+    deadline = timing_tools.datetime.now() - timing_tools.timedelta(seconds=1)
+    t0 = time.monotonic()
+    error = asyncio.run(scheduler.sleep_until(timing_tools.datetime.now, deadline))
+    assert time.monotonic() - t0 < 0.1
+    assert error >= 1
+
+# server clock offset estimation
+
+def test_clock_offset_estimator_narrows_down_offset():
+    true_offset = 12.3456
+    rtt = 0.02
+    samples = []
+    for i in range(20):
+        t_send = 1000. + i*0.137
+        server = t_send + rtt/2 + true_offset
+        samples += [(t_send, t_send + rtt, float(int(server)))] # Date header truncates to seconds
+
+    estimator = timing_tools.ClockOffsetEstimator()
+    offset, uncertainty, min_rtt = estimator.add_samples(samples)
+    assert abs(offset - true_offset) <= uncertainty
+    assert uncertainty < 0.05
+    assert abs(min_rtt - rtt) < 1e-9
+
+def test_clock_offset_estimator_inconsistent_samples():
+    samples = [(1000., 1000.01, 1010.), (1001., 1001.5, 1000.)]
+    estimator = timing_tools.ClockOffsetEstimator()
+    offset, uncertainty, rtt = estimator.add_samples(samples)
+    assert abs(offset - (1010. + 0.5 - 1000.005)) < 1e-9
+    assert uncertainty > 0.5
+
+def test_clock_offset_estimator_drift():
+    estimator = timing_tools.ClockOffsetEstimator()
+    assert estimator.drift() is None
+    estimator.history = [(0., 1., 0.01), (100., 1.001, 0.01)]
+    assert abs(estimator.drift() - 1e-5) < 1e-12
+
+# latency compensation
+
+def test_latency_compensator_lead_and_landing():
+    compensator = timing_tools.LatencyCompensator(margin=0.005, n_samples=3, spacing=0.)
+    assert compensator.lead() == timing_tools.timedelta(0)
+
+    rtts = iter([0.05, 0.03, 0.04])
+    async def probe():
+        rtt = next(rtts)
+        return 100., 100. + rtt, 100.
+
+    rtt = asyncio.run(compensator.measure(probe))
+    assert abs(rtt - 0.04) < 1e-9
+    assert compensator.lead() == timing_tools.timedelta(seconds=0.015)
+
+    landing = compensator.record_landing('TABATA', t_send=9.98, t_recv=10.02, t_open=10.)
+    assert abs(landing) < 1e-9
+    assert compensator.landings == [('TABATA', landing)]
+
+def test_latency_compensator_margin_larger_than_latency():
+    compensator = timing_tools.LatencyCompensator(margin=0.1)
+    compensator.rtt = 0.02
+    assert compensator.lead() == timing_tools.timedelta(0)
+
+# login scheduling
+
+def test_schedule_login_reconnect_or_expiry():
+    t_last_login = timing_tools.datetime(year=2022,month=5,day=2,hour=12)
+    t_reconnect = timing_tools.timedelta(seconds=3600)
+    assert timing_tools.schedule_login(t_last_login, t_reconnect) == t_last_login + t_reconnect
+
+    t_expiry = t_last_login + timing_tools.timedelta(seconds=1800)
+    t_login = timing_tools.schedule_login(t_last_login, t_reconnect, t_expiry=t_expiry)
+    assert t_login == t_expiry - timing_tools.timedelta(seconds=300)
+
+def test_schedule_login_fresh_token_before_window():
+    t_window = timing_tools.datetime(year=2022,month=5,day=3)
+    t_last_login = t_window - timing_tools.timedelta(seconds=1000)
+    t_reconnect = timing_tools.timedelta(seconds=3600)
+    t_login = timing_tools.schedule_login(t_last_login, t_reconnect, t_window=t_window)
+    assert t_login == t_window - timing_tools.timedelta(seconds=300)
+
+    # already fresh; the next regular login would fall into the window and is postponed
+    t_last_login = t_window - timing_tools.timedelta(seconds=300)
+    t_reconnect = timing_tools.timedelta(seconds=330)
+    t_login = timing_tools.schedule_login(t_last_login, t_reconnect, t_window=t_window)
+    assert t_login == t_window + timing_tools.timedelta(seconds=120)
+
+def test_schedule_login_overdue_respects_freeze():
+    t_window = timing_tools.datetime(year=2022,month=5,day=3)
+    t_last_login = t_window - timing_tools.timedelta(seconds=4000)
+    t_reconnect = timing_tools.timedelta(seconds=3600)
+
+    # fresh_lead before the window is already past: the login is due now, not in the past
+    t_now = t_window - timing_tools.timedelta(seconds=200)
+    t_login = timing_tools.schedule_login(t_last_login, t_reconnect, t_window=t_window, t_now=t_now)
+    assert t_login == t_now
+
+    # a login failed and is retried within the freeze (or at the opening): postponed after it
+    for seconds in [-60, 0, 60]:
+        t_now = t_window + timing_tools.timedelta(seconds=seconds)
+        t_login = timing_tools.schedule_login(t_last_login, t_reconnect, t_window=t_window, t_now=t_now)
+        assert t_login == t_window + timing_tools.timedelta(seconds=120)
+
+# retry policy
+
+def test_retry_policy_burst_stops_after_max_tries():
+    policy = timing_tools.RetryPolicy(mode='burst', max_tries=3, delay=0.1)
+    assert [policy.next_delay(tries, 0.) for tries in range(1,4)] == [0.1, 0.1, None]
+
+def test_retry_policy_exponential_capped_and_jittered():
+    policy = timing_tools.RetryPolicy(mode='exponential', max_tries=10, delay=0.1, factor=2., max_delay=0.5, rng=lambda: 0.)
+    delays = [policy.next_delay(tries, 0.) for tries in range(1,6)]
+    assert all(abs(d - e) < 1e-12 for d, e in zip(delays, [0.1, 0.2, 0.4, 0.5, 0.5]))
+
+    policy = timing_tools.RetryPolicy(mode='exponential', delay=0.1, jitter=0.5)
+    for tries in range(1,5):
+        delay = policy.next_delay(1, 0.)
+        assert 0.05 <= delay <= 0.1
+
+def test_retry_policy_deadline():
+    policy = timing_tools.RetryPolicy(mode='deadline', max_tries=1, delay=0.1, deadline=1.)
+    assert policy.next_delay(50, 0.85) == 0.1
+    assert policy.next_delay(50, 0.95) is None
+
+    with pytest.raises(ValueError):
+        timing_tools.RetryPolicy(mode='deadline')
+
+def test_retry_policy_run_retries_until_success():
+    results = iter([RuntimeError('timeout'), {'Status': 0}, {'Status': 1}])
+    async def call():
+        r = next(results)
+        if isinstance(r, Exception):
+            raise r
+        return r
+    def classify(out, error):
+        return 'retry' if error is not None or out['Status'] != 1 else 'success'
+
+    policy = timing_tools.RetryPolicy(mode='burst', max_tries=5, delay=0.)
+    attempts = asyncio.run(policy.run(call, classify))
+    assert [a['outcome'] for a in attempts] == ['retry', 'retry', 'success']
+    assert [a['try'] for a in attempts] == [1, 2, 3]
+    assert isinstance(attempts[0]['error'], RuntimeError)
+    assert attempts[2]['result'] == {'Status': 1}
+    assert all(a['t_send'] <= a['t_recv'] for a in attempts)
+
+def test_retry_policy_run_stops_on_terminal_outcome():
+    calls = []
+    async def call():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    policy = timing_tools.RetryPolicy(mode='burst', max_tries=5, delay=0.)
+    attempts = asyncio.run(policy.run(call, lambda out, error: 'terminal'))
+    assert len(calls) == 1
+    assert attempts[0]['outcome'] == 'terminal'
+
+def test_retry_policy_run_times_out_attempts():
+    delays = iter([10., 0.])
+    async def call():
+        await asyncio.sleep(next(delays))
+        return {'Status': 1}
+    def classify(out, error):
+        return 'retry' if error is not None else 'success'
+
+    policy = timing_tools.RetryPolicy(mode='burst', max_tries=3, delay=0., timeout=0.05)
+    t_start = time.perf_counter()
+    attempts = asyncio.run(policy.run(call, classify))
+    assert time.perf_counter() - t_start < 1.
+    assert [a['outcome'] for a in attempts] == ['retry', 'success']
+    assert isinstance(attempts[0]['error'], asyncio.TimeoutError)
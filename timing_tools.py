@@ -0,0 +1,343 @@
+import asyncio
+from datetime import datetime, timedelta
+import random
+import time
+
+from typing import Callable, Dict, List, Tuple, Union
+
+
+def next_window(t_now: datetime,
+                classes: List) -> Union[datetime,None]:
+    '''
+    next booking instant (midnight) after t_now which opens a weekday with at least one class;
+    classes is a list of class lists indexed by datetime.weekday()
+    '''
+    midnight = t_now.replace(hour=0,minute=0,second=0,microsecond=0)
+    for d in range(1,8):
+        t_window = midnight + timedelta(days=d)
+        if classes[t_window.weekday()]:
+            return t_window
+    return None
+
+
+def schedule_login(t_last_login: datetime,
+                   t_reconnect: timedelta,
+                   t_expiry: Union[datetime,None] = None,
+                   t_window: Union[datetime,None] = None,
+                   refresh_margin: timedelta = timedelta(seconds=300),
+                   fresh_lead: timedelta = timedelta(seconds=300),
+                   freeze: timedelta = timedelta(seconds=120),
+                   t_now: Union[datetime,None] = None) -> datetime:
+    '''
+    time of the next login
+
+    the token is renewed t_reconnect after the last login or refresh_margin before it expires, whichever
+    comes first; if the last login is older than fresh_lead before the upcoming booking window t_window
+    the token is renewed fresh_lead before it; no login happens within freeze of the window opening
+
+    an overdue login is due at t_now (if given), so the freeze also postpones it
+    '''
+    t_login = t_last_login + t_reconnect
+    if t_expiry is not None:
+        t_login = min(t_login, t_expiry - refresh_margin)
+
+    if t_window is not None:
+        # a second of tolerance since clock corrections shift the local time slightly
+        if t_last_login < t_window - fresh_lead - timedelta(seconds=1):
+            t_login = min(t_login, t_window - fresh_lead)
+    if t_now is not None:
+        t_login = max(t_login, t_now)
+
+    if t_window is not None:
+        if t_window - freeze <= t_login < t_window + freeze:
+            t_login = t_window + freeze
+
+    return t_login
+
+
+class DeadlineScheduler:
+    '''
+    sleeps until a wall-clock deadline without polling
+
+    far from the deadline the scheduler sleeps in coarse steps (re-reading the wall clock after each step
+    so that clock adjustments are followed); approach seconds before the deadline it converts the deadline
+    to the monotonic clock, sleeps until spin seconds before it and busy-waits the remainder
+    '''
+
+    def __init__(self,
+                 coarse_step: float = 60.,
+                 approach: float = 1.,
+                 spin: float = 0.002,
+                 clock: Callable = time.monotonic):
+
+        self.coarse_step = coarse_step
+        self.approach = approach
+        self.spin = spin
+        self.clock = clock
+
+        self.errors = [] # fire time errors in seconds (actual - deadline) of recorded sleeps
+
+    async def sleep_until(self,
+                          get_time: Callable,
+                          deadline: datetime,
+                          record: bool = True) -> float:
+        '''
+        sleep until get_time() reaches deadline; returns the fire time error in seconds, which is kept in errors
+        if record (sleeps other than fires pass record=False)
+        '''
+        remaining = (deadline - get_time()).total_seconds()
+        while remaining > self.approach:
+            await asyncio.sleep(min(self.coarse_step, remaining - self.approach))
+            remaining = (deadline - get_time()).total_seconds()
+
+        # final approach on the monotonic clock
+        t_deadline = self.clock() + remaining
+        return await self.sleep_until_monotonic(t_deadline, record)
+
+    async def sleep_until_monotonic(self,
+                                    t_deadline: float,
+                                    record: bool = True) -> float:
+        '''
+        sleep until the monotonic clock reaches t_deadline; returns the fire time error in seconds (see sleep_until)
+        '''
+        remaining = t_deadline - self.clock()
+        if remaining > self.spin:
+            await asyncio.sleep(remaining - self.spin)
+
+        while self.clock() < t_deadline:
+            pass
+
+        error = self.clock() - t_deadline
+        if record:
+            self.errors += [error]
+        return error
+
+    def max_error(self) -> float:
+        return max(self.errors) if self.errors else 0.
+
+
+class ClockOffsetEstimator:
+    '''
+    estimates the offset between the local and the server clock from HTTP Date headers
+
+    a Date header has a 1 sec resolution, so a single sample (t_send, t_recv, date) only says that
+    date - t_recv < offset < date + 1 - t_send; intersecting these intervals over samples taken at
+    different sub-second phases narrows the offset down to roughly the round-trip time
+    '''
+
+    def __init__(self,
+                 n_samples: int = 20,
+                 spacing: float = 0.137):
+
+        self.n_samples = n_samples
+        self.spacing = spacing # not a divisor of 1 sec so that samples cover different phases
+
+        self.history = [] # (local time, offset, uncertainty) of past estimates
+
+    async def estimate(self,
+                       probe: Callable) -> Union[Tuple[float,float,float],None]:
+        '''
+        sample the server clock n_samples times with probe (e.g. AsyncClient.probe_date);
+        returns (offset, uncertainty, min rtt) in seconds or None if no probe succeeded
+        '''
+        samples = []
+        for i in range(self.n_samples):
+            try:
+                samples += [await probe()]
+            except Exception as e:
+                print(f'clock probe failed: {e}')
+            await asyncio.sleep(self.spacing)
+
+        if len(samples) == 0:
+            return None
+        return self.add_samples(samples)
+
+    def add_samples(self,
+                    samples: List) -> Tuple[float,float,float]:
+        '''
+        compute (offset, uncertainty, min rtt) from (t_send, t_recv, date) samples and store it in history
+        '''
+        lo = max(date - t_recv for t_send, t_recv, date in samples)
+        hi = min(date + 1 - t_send for t_send, t_recv, date in samples)
+        rtt = min(t_recv - t_send for t_send, t_recv, date in samples)
+
+        if lo <= hi:
+            offset = (lo + hi)/2
+            uncertainty = (hi - lo)/2
+        else:
+            # inconsistent samples (clock step or a delayed response); trust the fastest round trip only
+            t_send, t_recv, date = min(samples, key=lambda x: x[1] - x[0])
+            offset = date + 0.5 - (t_send + t_recv)/2
+            uncertainty = 0.5 + rtt/2
+
+        self.history += [(samples[-1][1], offset, uncertainty)]
+        return offset, uncertainty, rtt
+
+    def drift(self) -> Union[float,None]:
+        '''
+        drift of the offset between the last two estimates (sec per sec)
+        '''
+        if len(self.history) < 2:
+            return None
+        (t0, offset0, _), (t1, offset1, _) = self.history[-2:]
+        if t1 == t0:
+            return None
+        return (offset1 - offset0)/(t1 - t0)
+
+
+class LatencyCompensator:
+    '''
+    shifts the send time of requests so that they arrive (rather than depart) at the window opening
+
+    requests are sent rtt/2 - margin before the opening, where rtt is the median round trip
+    measured on the live session; a positive margin makes requests land slightly after the opening
+    '''
+
+    def __init__(self,
+                 margin: float = 0.005,
+                 n_samples: int = 10,
+                 spacing: float = 0.05):
+
+        self.margin = margin
+        self.n_samples = n_samples
+        self.spacing = spacing
+
+        self.rtt = None
+        self.landings = [] # (label, landing time relative to the opening in seconds; <0 early, >0 late)
+
+    async def measure(self,
+                      probe: Callable) -> Union[float,None]:
+        '''
+        measure the median round trip of probe (e.g. AsyncClient.probe_date) in seconds
+        '''
+        rtts = []
+        for i in range(self.n_samples):
+            try:
+                t_send, t_recv, _ = await probe()
+                rtts += [t_recv - t_send]
+            except Exception as e:
+                print(f'rtt probe failed: {e}')
+            await asyncio.sleep(self.spacing)
+
+        if len(rtts) > 0:
+            rtts.sort()
+            self.rtt = rtts[len(rtts)//2]
+        return self.rtt
+
+    def lead(self) -> timedelta:
+        '''
+        how long before the opening requests should be sent
+        '''
+        if self.rtt is None:
+            return timedelta(0)
+        return timedelta(seconds=max(self.rtt/2 - self.margin, 0.))
+
+    def record_landing(self,
+                       label: str,
+                       t_send: float,
+                       t_recv: float,
+                       t_open: float) -> float:
+        '''
+        estimate when a request sent at t_send and answered at t_recv reached the server, relative to t_open
+        '''
+        landing = t_send + (t_recv - t_send)/2 - t_open
+        self.landings += [(label, landing)]
+        return landing
+
+
+class RetryPolicy:
+    '''
+    when to retry a request whose outcome is retryable
+
+    'burst' retries after a fixed delay up to max_tries attempts; 'exponential' multiplies the delay by factor
+    after every attempt (up to max_delay) and spreads it by jitter, also up to max_tries attempts; 'deadline'
+    retries after a jittered fixed delay for as long as the next attempt starts within deadline seconds of the
+    first one; a deadline also bounds the other modes
+
+    an attempt not answered within timeout seconds (None disables) is cancelled and retried like any other
+    timeout; delays are shortened by a random fraction of at most jitter (0 disables) so that concurrent retries spread out
+    '''
+
+    def __init__(self,
+                 mode: str = 'burst',
+                 max_tries: int = 5,
+                 delay: float = 0.1,
+                 factor: float = 2.,
+                 max_delay: float = 2.,
+                 jitter: float = 0.,
+                 deadline: Union[float,None] = None,
+                 timeout: Union[float,None] = None,
+                 rng: Callable = random.random):
+
+        if mode not in ('burst','exponential','deadline'):
+            raise ValueError('unknown retry mode')
+        if mode == 'deadline' and deadline is None:
+            raise ValueError('deadline retry mode needs a deadline')
+
+        self.mode = mode
+        self.max_tries = max_tries
+        self.delay = delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.timeout = timeout
+        self.rng = rng
+
+    def next_delay(self,
+                   tries: int,
+                   elapsed: float) -> Union[float,None]:
+        '''
+        delay before the next attempt after tries attempts taking elapsed seconds so far; None to give up
+        '''
+        if self.mode != 'deadline' and tries >= self.max_tries:
+            return None
+
+        delay = self.delay
+        if self.mode == 'exponential':
+            delay = min(self.delay*self.factor**(tries-1), self.max_delay)
+        delay *= 1 - self.jitter*self.rng()
+
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+    async def run(self,
+                  call: Callable,
+                  classify: Callable,
+                  clock: Callable = time.perf_counter) -> List[Dict]:
+        '''
+        await call() until classify(result, error) is not 'retry' or the policy gives up; the delays are
+        non-blocking sleeps
+
+        classify returns 'success', 'retry' or 'terminal'; every attempt is recorded as a dict with
+        the try number, t_send and t_recv (clock times), outcome, result and error
+        '''
+        attempts = []
+        t_first = clock()
+        while True:
+            t_send = clock()
+            result, error = None, None
+            try:
+                if self.timeout is None:
+                    result = await call()
+                else:
+                    result = await asyncio.wait_for(call(), self.timeout)
+            except Exception as e:
+                error = e
+            t_recv = clock()
+
+            outcome = classify(result, error)
+            attempts += [{'try': len(attempts)+1,
+                          't_send': t_send,
+                          't_recv': t_recv,
+                          'outcome': outcome,
+                          'result': result,
+                          'error': error}]
+            if outcome != 'retry':
+                return attempts
+
+            delay = self.next_delay(len(attempts), clock() - t_first)
+            if delay is None:
+                return attempts
+            await asyncio.sleep(delay)